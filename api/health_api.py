@@ -0,0 +1,21 @@
+"""API for the health of the Dashboard"""
+
+import fastapi
+from fastapi.encoders import jsonable_encoder
+from models.health import Readiness
+from services import lifecycle_service
+
+router = fastapi.APIRouter()
+
+
+@router.get("/ready", response_model=Readiness, responses={503: {"model": Readiness}})
+async def get_ready() -> fastapi.responses.JSONResponse:
+    """Check if the startup is finished and the caches are warm
+
+    Returns:
+        fastapi.responses.JSONResponse: Readiness with status code 200 if ready, else 503
+    """
+    readiness = lifecycle_service.readiness()
+    return fastapi.responses.JSONResponse(
+        content=jsonable_encoder(readiness), status_code=200 if readiness.ready else 503
+    )
@@ -0,0 +1,35 @@
+"""API for reading the saved probe history of the services"""
+
+import asyncio
+import time
+from typing import List
+
+import fastapi
+from models.history import ProbeSample
+from services import history_service
+
+router = fastapi.APIRouter()
+
+
+@router.get("/api/service/{name}/history", response_model=List[ProbeSample])
+async def get_service_history(
+    name: str, start: float = 0, end: float = None, limit: int = fastapi.Query(1000, gt=0, le=100000)
+) -> List[ProbeSample]:
+    """Get the saved probe results of one service in a time range. If there are more results than the limit,
+    the newest are returned
+
+    Args:
+        name (str): Name of the Service
+        start (float, optional): Unix time of the oldest result. Defaults to 0
+        end (float, optional): Unix time of the newest result. Defaults to now
+        limit (int, optional): Maximal number of results. Defaults to 1000
+
+    Returns:
+        List[ProbeSample]: Probe results ordered by the time. Empty if the history is disabled
+    """
+    store = history_service.store
+    if store is None:
+        return []
+    end = time.time() if end is None else end
+    # Reading the segments blocks, the probes keep running in the event loop
+    return await asyncio.to_thread(store.query, start, end, name=name, limit=limit, newest=True)
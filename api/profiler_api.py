@@ -0,0 +1,30 @@
+"""Admin API to read the collected request profiles"""
+
+from typing import List
+
+import fastapi
+from models.profile import RouteProfile
+from services import profiler_service
+
+router = fastapi.APIRouter()
+
+
+@router.get("/api/admin/profiles", response_model=List[RouteProfile])
+async def get_profiles() -> List[RouteProfile]:
+    """Get the most sampled stacks of all profiled routes
+
+    Returns:
+        List[RouteProfile]: Profiles sorted by the total wall time
+    """
+    return profiler_service.profiler.report()
+
+
+@router.delete("/api/admin/profiles", status_code=204)
+async def clear_profiles() -> fastapi.Response:
+    """Remove all collected profiles
+
+    Returns:
+        fastapi.Response: Empty response
+    """
+    profiler_service.profiler.clear()
+    return fastapi.Response(status_code=204)
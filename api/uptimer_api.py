@@ -1,15 +1,50 @@
 """API for managing the services for the check if they reachable"""
 
-from typing import List
+from typing import List, Optional
 
 import fastapi
-from models.service import ConfigService, PingService, Service
+from models.service import ConfigService, PingService, Service, ServicePatch, VersionedService
 from models.service_error import BulkServiceError, PingError, ServiceDuplicate, ServiceError, ServiceNotFound
 from services import uptimer_service
 
 router = fastapi.APIRouter()
 
 
+def etag(version: int) -> str:
+    """Build the ETag header for a service version
+
+    Args:
+        version (int): Version of the service
+
+    Returns:
+        str: Quoted version
+    """
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Get the expected service version from the If-Match header
+
+    Args:
+        if_match (Optional[str]): Value of the If-Match header like "3"
+
+    Raises:
+        fastapi.HTTPException: If the header is not a version
+
+    Returns:
+        Optional[int]: Expected version, None if the header is missing or *
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError as error:
+        raise fastapi.HTTPException(status_code=400, detail="If-Match must be a service version like \"3\"") from error
+
+
 @router.post("/api/service/{name}/add", response_model=ConfigService)
 async def add_service(name: str, url: str, ping: bool = False) -> ConfigService:
     """Add one service to the configuration. The name hase to be unique in the configuration
@@ -100,13 +135,15 @@ async def delete_services(services: List[Service]) -> ConfigService:
 
 
 @router.get("/api/service/{name}/config", response_model=ConfigService)
-async def get_service(name: str) -> ConfigService:
-    """Get specific Config Service Configuration
+async def get_service(name: str, response: fastapi.Response) -> ConfigService:
+    """Get specific Config Service Configuration. The ETag header contains the version for updates with If-Match
 
     Returns:
         ConfigService: Service with config
     """
-    return uptimer_service.get_service(name)
+    service = uptimer_service.get_versioned_service(name)
+    response.headers["ETag"] = etag(service.version)
+    return service
 
 
 @router.get("/api/services/config", response_model=List[ConfigService])
@@ -166,16 +203,44 @@ async def ping_services(services: List[PingService]) -> List[PingService]:
     return s_services
 
 
-@router.put("/api/service/{name}/update", response_model=ConfigService)
-async def update_service(name: str, updated_service: ConfigService) -> ConfigService:
+@router.put("/api/service/{name}/update", response_model=VersionedService)
+async def update_service(
+    name: str,
+    updated_service: ConfigService,
+    response: fastapi.Response,
+    if_match: Optional[str] = fastapi.Header(None),
+) -> VersionedService:
     """Update the configuration of one service. You also can change the name of the service with this update
 
     Args:
         name (str): name of the service to update
         updated_service (ConfigService): The new configuration
+        if_match (str, optional): Only update if the service still has this version (ETag of the config)
 
     Returns:
-        ConfigService: the new settings for the service
+        VersionedService: the new settings for the service with the new version
     """
     old_service = Service(name=name)
-    return uptimer_service.update_service(old_service, updated_service)
+    service = uptimer_service.update_service(old_service, updated_service, parse_if_match(if_match))
+    response.headers["ETag"] = etag(service.version)
+    return service
+
+
+@router.patch("/api/service/{name}/update", response_model=VersionedService)
+async def patch_service(
+    name: str, changes: ServicePatch, response: fastapi.Response, if_match: Optional[str] = fastapi.Header(None)
+) -> VersionedService:
+    """Change only the given fields of one service. You also can change the name of the service with this update
+
+    Args:
+        name (str): name of the service to change
+        changes (ServicePatch): Fields to change
+        if_match (str, optional): Only change if the service still has this version (ETag of the config)
+
+    Returns:
+        VersionedService: the new settings for the service with the new version
+        fastapi.responses.JSONResponse: Status code 412 if the service was changed in the meantime
+    """
+    service = uptimer_service.patch_service(name, changes, parse_if_match(if_match))
+    response.headers["ETag"] = etag(service.version)
+    return service
@@ -1,23 +1,51 @@
 """Main for the Dashboard"""
+import time
+
+_import_started = time.perf_counter()
+
+# pylint: disable=wrong-import-position
 import fastapi
-import uvicorn
 from fastapi.encoders import jsonable_encoder
 
-from api import uptimer_api
+from api import health_api, history_api, profiler_api, uptimer_api
 from models.service_error import BulkServiceError, ServiceError
+from models.settings import get_settings
 from models.validation_error import InvalidURL
+from services import lifecycle_service
+from services.profiler_service import ProfilerMiddleware
 
 api = fastapi.FastAPI()
 
 
 def configure():
-    """Do initial config on start"""
+    """Wire the app. Only routing, all settings are read and all files are opened on startup"""
     configure_routing()
+    configure_middleware()
 
 
 def configure_routing():
     """Add all Router for FastAPI"""
     api.include_router(uptimer_api.router)
+    api.include_router(profiler_api.router)
+    api.include_router(history_api.router)
+    api.include_router(health_api.router)
+
+
+def configure_middleware():
+    """Add all Middleware for FastAPI"""
+    api.add_middleware(ProfilerMiddleware)
+
+
+@api.on_event("startup")
+async def startup():
+    """Read the settings, warm up the caches and start the background tasks"""
+    await lifecycle_service.startup(get_settings())
+
+
+@api.on_event("shutdown")
+async def shutdown():
+    """Stop the background tasks and deliver the remaining alerts"""
+    await lifecycle_service.shutdown()
 
 
 @api.exception_handler(BulkServiceError)
@@ -79,8 +107,10 @@ async def general_exception_handler(request, exc: Exception):
     return fastapi.responses.JSONResponse(content=content, status_code=500)
 
 
+configure()
+lifecycle_service.import_seconds = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
-    configure()
+    import uvicorn
+
     uvicorn.run(api, port=8000, host="127.0.0.1")
-else:
-    configure()
@@ -0,0 +1,62 @@
+"""Contains the BaseModels for the Alerts"""
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class AlertKind(str, Enum):
+    """Kind of the state change of a Service"""
+
+    DOWN = "down"
+    UP = "up"
+    FLAPPING = "flapping"
+
+
+class Alert(BaseModel):
+    """Confirmed state change of one Service
+
+    Args:
+        name (str): Name of the Service
+        kind (AlertKind): New state of the Service
+        timestamp (float): Unix time of the state change
+        error_msg (str, optional): Last error of the Service if it is down
+    """
+
+    name: str
+    kind: AlertKind
+    timestamp: float
+    error_msg: Optional[str] = None
+
+
+class AlertBatch(BaseModel):
+    """Grouped Alerts for one webhook delivery
+
+    Args:
+        count (int): Number of all Alerts in the batch
+        down (List[Alert]): Services that are down
+        up (List[Alert]): Services that are up again
+        flapping (List[Alert]): Services that change the state to often
+    """
+
+    count: int
+    down: List[Alert] = []
+    up: List[Alert] = []
+    flapping: List[Alert] = []
+
+    @classmethod
+    def from_alerts(cls, alerts: List[Alert]) -> "AlertBatch":
+        """Group the Alerts by the kind
+
+        Args:
+            alerts (List[Alert]): Alerts to group
+
+        Returns:
+            AlertBatch: Grouped Alerts
+        """
+        return cls(
+            count=len(alerts),
+            down=[alert for alert in alerts if alert.kind == AlertKind.DOWN],
+            up=[alert for alert in alerts if alert.kind == AlertKind.UP],
+            flapping=[alert for alert in alerts if alert.kind == AlertKind.FLAPPING],
+        )
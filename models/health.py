@@ -0,0 +1,20 @@
+"""Contains the BaseModel for the health of the Dashboard"""
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class Readiness(BaseModel):
+    """State of the startup
+
+    Args:
+        ready (bool): All caches are warm and the background tasks are running
+        import_seconds (float): Time to import the app
+        startup_seconds (float): Time of the startup
+        steps (Dict[str, float]): Time of every startup step in seconds
+    """
+
+    ready: bool
+    import_seconds: float
+    startup_seconds: float
+    steps: Dict[str, float]
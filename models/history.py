@@ -0,0 +1,20 @@
+"""Contains the BaseModel for the probe history"""
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ProbeSample(BaseModel):
+    """One saved probe result of a Service
+
+    Args:
+        name (str): Name of the Service
+        timestamp (float): Unix time of the probe
+        latency (float, optional): Response time in seconds, None if the Service was not reachable
+        status (int): HTTP status code, 0 if the Service was not reachable
+    """
+
+    name: str
+    timestamp: float
+    latency: Optional[float] = None
+    status: int
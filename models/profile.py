@@ -0,0 +1,34 @@
+"""Contains the BaseModels for the request profiles"""
+from typing import List
+
+from pydantic import BaseModel
+
+
+class StackSample(BaseModel):
+    """One sampled stack of a route
+
+    Args:
+        stack (List[str]): Frames as file:function:line from the outermost to the innermost
+        samples (int): How often the stack was sampled
+        seconds (float): Estimated wall time spend in the stack
+    """
+
+    stack: List[str]
+    samples: int
+    seconds: float
+
+
+class RouteProfile(BaseModel):
+    """Collected profile of one route
+
+    Args:
+        route (str): Method and path of the route
+        requests (int): Number of profiled requests
+        wall_time (float): Total wall time of the profiled requests in seconds
+        stacks (List[StackSample]): Most sampled stacks
+    """
+
+    route: str
+    requests: int
+    wall_time: float
+    stacks: List[StackSample]
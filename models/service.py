@@ -37,6 +37,31 @@ class ConfigService(Service):
         return url
 
 
+class VersionedService(ConfigService):
+    """ConfigService with the version of the config. Every change sets a new random version, so a version is
+    never used twice, also not after the Service was deleted and added again
+
+    Args:
+        version (int): Version of the Service. Default set to 1 for configs without versions
+    """
+
+    version: int = 1
+
+
+class ServicePatch(BaseModel):
+    """Partial update of a ConfigService. Only the given fields are changed
+
+    Args:
+        name (str, optional): New name of the Service
+        url (str, optional): New URL String
+        ping (bool, optional): Activate automated ping
+    """
+
+    name: Optional[str] = None
+    url: Optional[str] = None
+    ping: Optional[bool] = None
+
+
 class PingService(Service):
     """Return Object if you pinged a Service"""
 
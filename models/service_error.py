@@ -22,6 +22,10 @@ class ServiceNotFound(ServiceError):
     """Exception if the requested service does not exist in the DB"""
 
 
+class ServiceVersionConflict(ServiceError):
+    """Exception if the service was changed since the version the client knows"""
+
+
 class PingError(ServiceError):
     """Exception if Status Code is invalid"""
 
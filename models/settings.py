@@ -0,0 +1,91 @@
+"""Contains the Settings for the Dashboard"""
+import os
+import socket
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """Settings of the Dashboard. Every field can be set with the environment variable DASHBOARD_<FIELD>
+
+    Args:
+        services_path (str): JSON-Config of the Services. Relative paths start in the working directory
+        alert_webhook_url (str): Send the alerts to this webhook. Alerting is disabled if not set
+        alert_confirm_after (int): Number of equal probe results before a state change is confirmed
+        alert_flap_window (float): Time window in seconds to count state changes for the flap detection
+        alert_flap_threshold (int): Number of state changes in the window to mark a service as flapping
+        alert_batch_window (float): Time in seconds to collect alerts for one webhook delivery
+        alert_max_batch (int): Maximal number of alerts in one webhook delivery
+        alert_queue_size (int): Maximal number of alerts waiting for the delivery
+        alert_retries (int): Number of retries if a webhook delivery failed
+        alert_retry_backoff (float): Initial wait time in seconds between the retries, doubled after each retry
+        profile_enabled (bool): Profile a fraction of all requests
+        profile_sample_rate (float): Fraction of the requests to profile if enabled
+        profile_header (str): Requests with this header are always profiled if profile_header_enabled is set
+        profile_header_enabled (bool): Allow clients to request a profile with the profile_header. Anyone who can
+            reach the API can then start the sampling, only enable it for debugging
+        profile_interval (float): Time in seconds between two stack samples
+        profile_max_stacks (int): Number of stacks to keep per route
+        profile_max_routes (int): Number of routes to keep profiles for
+        history_path (str): Directory of the probe history. The history is disabled if empty
+        history_segment_seconds (int): Time range of one history segment
+        history_retention_days (float): Delete the history segments older than this
+        probe_enabled (bool): Ping the Services with ping enabled automatic
+        probe_interval (float): Time in seconds between two automatic pings of a Service
+        probe_concurrency (int): Maximal number of parallel automatic pings per worker
+        shard_store (str): SQLite file shared by all workers to split the Services between them
+        shard_member_id (str, optional): Unique id of this worker. Defaults to <hostname>:<pid>
+        shard_heartbeat_interval (float): Time in seconds between two heartbeats of a worker
+        shard_member_ttl (float): Workers without a heartbeat in this time are removed
+    """
+
+    services_path: str = "data/services.json"
+    alert_webhook_url: Optional[str] = None
+    alert_confirm_after: int = 2
+    alert_flap_window: float = 300.0
+    alert_flap_threshold: int = 4
+    alert_batch_window: float = 5.0
+    alert_max_batch: int = 100
+    alert_queue_size: int = 1000
+    alert_retries: int = 3
+    alert_retry_backoff: float = 0.5
+    profile_enabled: bool = False
+    profile_sample_rate: float = 0.01
+    profile_header: str = "X-Profile"
+    profile_header_enabled: bool = False
+    profile_interval: float = 0.005
+    profile_max_stacks: int = 20
+    profile_max_routes: int = 100
+    history_path: str = "data/history"
+    history_segment_seconds: int = 86400
+    history_retention_days: float = 90.0
+    probe_enabled: bool = True
+    probe_interval: float = 60.0
+    probe_concurrency: int = 50
+    shard_store: str = "data/shards.sqlite3"
+    shard_member_id: Optional[str] = None
+    shard_heartbeat_interval: float = 10.0
+    shard_member_ttl: float = 30.0
+
+    class Config:
+        env_prefix = "DASHBOARD_"
+
+    def member_id(self) -> str:
+        """Get the unique id of this worker
+
+        Returns:
+            str: shard_member_id or <hostname>:<pid>
+        """
+        return self.shard_member_id or f"{socket.gethostname()}:{os.getpid()}"
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    """Get the Settings of the Dashboard. The environment is read only once
+
+    Returns:
+        Settings: Settings of the Dashboard
+    """
+    return Settings()
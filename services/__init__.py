@@ -1,13 +1,58 @@
 """Backend Services for the API"""
+import errno
 import json
+import os
+import secrets
+import stat
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastapi.encoders import jsonable_encoder
-from models.service import ConfigService
+from models.service import ConfigService, VersionedService
 
-services_path = Path("data/services.json").absolute()
-services_path.touch(mode=644)
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# Config path of the Dashboard, set by uptimer_service.configure on startup
+services_path = Path("data/services.json")
+
+# Path -> ((inode, mtime, size), VersionedServices) of the last read config. Every write replaces the file,
+# so the inode also changes if a other worker writes in the same mtime tick with the same size
+_conf_cache: Dict[Path, Tuple[Tuple[int, int, int], List[VersionedService]]] = {}
+
+
+def set_services_path(path: Path) -> None:
+    """Set the config path of the Dashboard
+
+    Args:
+        path (Path): Path to the JSON-Config
+    """
+    global services_path
+    services_path = path
+
+
+def get_versioned_services(path: Path, use_cache: bool = True) -> List[VersionedService]:
+    """Get the Services with the version from the config. The config is only parsed again if the file changed
+
+    Args:
+        path (Path): Path to the JSON-Config
+        use_cache (bool, optional): Use the cache. Read-modify-write under the config_lock must read the file.
+            Defaults to True
+
+    Returns:
+        List[VersionedService]: All Services with the version
+    """
+    path = Path(path)
+    file_stat = path.stat()
+    version = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+    cached = _conf_cache.get(path) if use_cache else None
+    if cached is None or cached[0] != version:
+        cached = (version, [VersionedService(**service) for service in get_json_data(path)])
+        _conf_cache[path] = cached
+    return [service.copy() for service in cached[1]]
 
 
 def get_conf_services(path: Path) -> List[ConfigService]:
@@ -19,17 +64,37 @@ def get_conf_services(path: Path) -> List[ConfigService]:
     Returns:
         List[ConfigService]: All ConfigServices
     """
-    return [ConfigService(**service) for service in get_json_data(path)]
+    return [ConfigService(**service.dict(exclude={"version"})) for service in get_versioned_services(path)]
+
+
+@contextmanager
+def config_lock(path: Path) -> Iterator[None]:
+    """Lock the config against changes of other workers while reading and writing it.
+    Without fcntl only the single write is atomic.
+
+    Args:
+        path (Path): Path to the JSON-Config
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{os.fspath(path)}.lock", mode="a", encoding="utf8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 
 def safe_conf_services(services: List[ConfigService], path: Path) -> None:
-    """Safe all ConfigServices to the JSON Config
+    """Safe all ConfigServices to the JSON Config. VersionedServices keep the version
 
     Args:
         services (List[ConfigService]): Services to safe
         path (Path): Path to the JSON-Config
     """
     json_data = jsonable_encoder(services)
+    _conf_cache.pop(Path(path), None)
     set_json_data(json_data, path)
 
 
@@ -47,11 +112,40 @@ def get_json_data(path: Path) -> Any:
 
 
 def set_json_data(data: Any, path: Path) -> None:
-    """Safe the Data to a File with pretty-print.
+    """Safe the Data to a File with pretty-print. The File is replaced at once, so readers never see a half file.
+    The File keeps its permissions. A symlink is followed and the file it points to is replaced.
+    A file that can not be replaced, like a single file bind mount, is written in place instead
 
     Args:
         data (Any): Data that accept the json.dump
         path (Path): Full Path to the File
     """
-    with open(path, mode="w", encoding="utf8") as file:
-        json.dump(data, file, indent="\t")
+    path = os.path.realpath(path)
+    text = json.dumps(data, indent="\t")
+    try:
+        mode: Optional[int] = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+    tmp_path = os.path.join(os.path.dirname(path), f".services-{secrets.token_hex(8)}.tmp")
+    # Created like open does, so a new file gets the mode of the current umask
+    fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    try:
+        with os.fdopen(fd, mode="w", encoding="utf8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except OSError as error:
+        os.unlink(tmp_path)
+        # EBUSY: the file is a mount point, EXDEV: rename over a mount. Readers can see a half file in this case
+        if error.errno not in (errno.EBUSY, errno.EXDEV) or mode is None:
+            raise
+        with open(path, mode="w", encoding="utf8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,258 @@
+"""Detect state changes of the Services and deliver them batched to a webhook"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from models.alert import Alert, AlertBatch, AlertKind
+from models.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceState:
+    """Probe history of one Service for the state change detection
+
+    Args:
+        up (bool, optional): Confirmed state of the Service. None until the first state is confirmed
+        notified (bool, optional): Last state that was send as Alert
+        pending (bool, optional): State of the last probe
+        pending_count (int): Number of probes in a row with the pending state
+        flapping (bool): Service changes the state to often
+        flips (Deque[float]): Times of the state changes in the flap window
+    """
+
+    def __init__(self) -> None:
+        self.up: Optional[bool] = None
+        self.notified: Optional[bool] = None
+        self.pending: Optional[bool] = None
+        self.pending_count = 0
+        self.flapping = False
+        self.flips: Deque[float] = deque()
+
+
+class AlertPipeline:
+    """Collect the probe results, detect confirmed state changes and deliver them grouped to a webhook.
+
+    The probes only put the Alerts to a bounded queue, the delivery with retry is done by one background task.
+    """
+
+    def __init__(
+        self,
+        webhook_url: str,
+        confirm_after: int = 2,
+        flap_window: float = 300.0,
+        flap_threshold: int = 4,
+        batch_window: float = 5.0,
+        max_batch: int = 100,
+        queue_size: int = 1000,
+        retries: int = 3,
+        retry_backoff: float = 0.5,
+    ) -> None:
+        self.webhook_url = webhook_url
+        self.confirm_after = max(confirm_after, 1)
+        self.flap_window = flap_window
+        self.flap_threshold = flap_threshold
+        self.batch_window = batch_window
+        self.max_batch = max(max_batch, 1)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.states: Dict[str, ServiceState] = {}
+        self.queue: "asyncio.Queue[Alert]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        # Alerts the worker collected in the current batch window
+        self.batch: List[Alert] = []
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AlertPipeline":
+        """Create the pipeline with the alert settings
+
+        Args:
+            settings (Settings): Settings with a alert_webhook_url
+
+        Returns:
+            AlertPipeline: Not started pipeline
+        """
+        return cls(
+            webhook_url=settings.alert_webhook_url,
+            confirm_after=settings.alert_confirm_after,
+            flap_window=settings.alert_flap_window,
+            flap_threshold=settings.alert_flap_threshold,
+            batch_window=settings.alert_batch_window,
+            max_batch=settings.alert_max_batch,
+            queue_size=settings.alert_queue_size,
+            retries=settings.alert_retries,
+            retry_backoff=settings.alert_retry_backoff,
+        )
+
+    def observe(self, name: str, up: bool, error_msg: str = None, now: float = None) -> Optional[Alert]:
+        """Add one probe result and queue a Alert if the state of the Service changed
+
+        Args:
+            name (str): Name of the Service
+            up (bool): Result of the probe
+            error_msg (str, optional): Error of the probe if the Service is down
+            now (float, optional): Unix time of the probe. Defaults to the current time
+
+        Returns:
+            Optional[Alert]: The queued Alert, None if nothing changed or the change is suppressed
+        """
+        now = time.time() if now is None else now
+        state = self.states.setdefault(name.lower(), ServiceState())
+
+        if state.pending == up:
+            state.pending_count += 1
+        else:
+            if state.pending is not None:
+                state.flips.append(now)
+            state.pending = up
+            state.pending_count = 1
+
+        while state.flips and state.flips[0] <= now - self.flap_window:
+            state.flips.popleft()
+
+        if state.pending_count >= self.confirm_after:
+            state.up = up
+
+        was_flapping = state.flapping
+        state.flapping = len(state.flips) >= self.flap_threshold
+        if state.flapping:
+            if was_flapping:
+                return None
+            return self._enqueue(Alert(name=name, kind=AlertKind.FLAPPING, timestamp=now, error_msg=error_msg))
+
+        if state.up is None or state.up == state.notified:
+            return None
+        # The first confirmed state is only worth a Alert if the Service is down
+        first = state.notified is None
+        state.notified = state.up
+        if first and state.up:
+            return None
+        kind = AlertKind.UP if state.up else AlertKind.DOWN
+        return self._enqueue(Alert(name=name, kind=kind, timestamp=now, error_msg=None if up else error_msg))
+
+    def _enqueue(self, alert: Alert) -> Optional[Alert]:
+        try:
+            self.queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Alert queue is full, dropped alert for %s", alert.name)
+            return None
+        return alert
+
+    async def start(self) -> None:
+        """Start the background task for the delivery"""
+        if self._worker is None:
+            self._stopping = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and deliver all collected and queued Alerts"""
+        if self._worker is not None:
+            self._stopping.set()
+            await self._worker
+            self._worker = None
+        pending, self.batch = self.batch, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for start in range(0, len(pending), self.max_batch):
+            await self.deliver(pending[start : start + self.max_batch])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = 0.0
+        # The get is kept over the batch window timeouts, so no Alert is lost by a cancelled get
+        getter: Optional[asyncio.Future] = None
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(self.queue.get())
+                timeout = max(deadline - loop.time(), 0) if self.batch else None
+                done, _ = await asyncio.wait({getter, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    if not self.batch:
+                        deadline = loop.time() + self.batch_window
+                    self.batch.append(getter.result())
+                    getter = None
+                if stopping in done:
+                    return
+                if self.batch and (len(self.batch) >= self.max_batch or loop.time() >= deadline):
+                    batch, self.batch = self.batch, []
+                    await self.deliver(batch)
+        finally:
+            stopping.cancel()
+            if getter is not None:
+                getter.cancel()
+
+    async def deliver(self, alerts: List[Alert]) -> bool:
+        """Send the Alerts grouped in one request to the webhook. Retry on connection errors and server errors
+
+        Args:
+            alerts (List[Alert]): Alerts to send
+
+        Returns:
+            bool: True if the webhook accepted the Alerts
+        """
+        if not alerts:
+            return True
+        payload = jsonable_encoder(AlertBatch.from_alerts(alerts))
+        backoff = self.retry_backoff
+        async with httpx.AsyncClient() as client:
+            for attempt in range(self.retries + 1):
+                try:
+                    resp = await client.post(self.webhook_url, json=payload)
+                    resp.raise_for_status()
+                    return True
+                except httpx.HTTPStatusError as error:
+                    if error.response.status_code < 500:
+                        logger.error("Webhook rejected %d alerts: %s", len(alerts), error)
+                        return False
+                    logger.warning("Webhook delivery attempt %d failed: %s", attempt + 1, error)
+                except httpx.RequestError as error:
+                    logger.warning("Webhook delivery attempt %d failed: %s", attempt + 1, error)
+                if attempt < self.retries:
+                    await asyncio.sleep(backoff)
+                    backoff *= 2
+        logger.error("Could not deliver %d alerts to the webhook", len(alerts))
+        return False
+
+
+pipeline: Optional[AlertPipeline] = None
+
+
+async def start(settings: Settings) -> None:
+    """Create and start the pipeline if a webhook is configured
+
+    Args:
+        settings (Settings): Settings of the Dashboard
+    """
+    global pipeline
+    if settings.alert_webhook_url and pipeline is None:
+        pipeline = AlertPipeline.from_settings(settings)
+        await pipeline.start()
+
+
+async def stop() -> None:
+    """Deliver the remaining Alerts and remove the pipeline"""
+    global pipeline
+    if pipeline is not None:
+        await pipeline.stop()
+        pipeline = None
+
+
+def observe(name: str, up: bool, error_msg: str = None) -> None:
+    """Add one probe result to the pipeline. Does nothing if alerting is disabled
+
+    Args:
+        name (str): Name of the Service
+        up (bool): Result of the probe
+        error_msg (str, optional): Error of the probe if the Service is down
+    """
+    if pipeline is not None:
+        pipeline.observe(name, up, error_msg)
@@ -0,0 +1,489 @@
+"""Append-only columnar storage for the probe history of the Services.
+
+The history is split into one directory per member and into segments by time. Every segment is a directory
+with one file per column and every column is a array of fixed width values. New samples are appended to the
+newest segment, queries read the columns memory-mapped, so nothing has to be parsed on startup.
+"""
+import logging
+import math
+import mmap
+import re
+import shutil
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from models.history import ProbeSample
+from models.settings import Settings
+
+from services import get_json_data, set_json_data
+
+logger = logging.getLogger(__name__)
+
+# Column name -> struct format of one value
+COLUMNS: Dict[str, str] = {
+    "timestamp": "d",
+    "service": "I",
+    "latency": "f",
+    "status": "H",
+}
+
+# timestamp, name, latency, status of one sample
+Row = Tuple[float, str, Optional[float], int]
+
+
+class Segment:
+    """All samples of one time range
+
+    Args:
+        path (Path): Directory of the segment
+        start (int): Unix time of the first second in the segment
+    """
+
+    def __init__(self, path: Path, start: int) -> None:
+        self.path = path
+        self.start = start
+        self.last_timestamp = -math.inf
+        self._files: Dict[str, BinaryIO] = {}
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def column_path(self, column: str) -> Path:
+        """Get the file of a column
+
+        Args:
+            column (str): Name of the column
+
+        Returns:
+            Path: File with the values of the column
+        """
+        return self.path / f"{column}.{COLUMNS[column]}"
+
+    def open_append(self) -> None:
+        """Open the column files for appending"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        rows = 0
+        columns = self.read()
+        if columns is not None and len(columns["timestamp"]) > 0:
+            rows = len(columns["timestamp"])
+            self.last_timestamp = columns["timestamp"][-1]
+        self.release(columns)
+        self.close_maps()
+        for column, fmt in COLUMNS.items():
+            file = open(self.column_path(column), mode="ab", buffering=0)
+            # Cut rows of a interrupted append, so all columns stay aligned
+            file.truncate(rows * struct.calcsize(fmt))
+            self._files[column] = file
+
+    def append(self, timestamp: float, service: int, latency: float, status: int) -> None:
+        """Append one row. Timestamps are kept sorted inside the segment
+
+        Args:
+            timestamp (float): Unix time of the probe
+            service (int): Id of the Service
+            latency (float): Response time in seconds, NaN if the Service was not reachable
+            status (int): HTTP status code, 0 if the Service was not reachable
+        """
+        self.last_timestamp = max(timestamp, self.last_timestamp)
+        values = {"timestamp": self.last_timestamp, "service": service, "latency": latency, "status": status}
+        for column, fmt in COLUMNS.items():
+            self._files[column].write(struct.pack(fmt, values[column]))
+
+    def read(self) -> Optional[Dict[str, memoryview]]:
+        """Memory-map all columns. Rows that are not written to every column are ignored
+
+        Returns:
+            Optional[Dict[str, memoryview]]: Typed views of the columns, None if the segment is empty
+        """
+        raw: Dict[str, memoryview] = {}
+        for column in COLUMNS:
+            path = self.column_path(column)
+            size = path.stat().st_size if path.exists() else 0
+            if size == 0:
+                self.release(raw)
+                return None
+            mapped = self._maps.get(column)
+            if mapped is None or len(mapped) != size:
+                if mapped is not None:
+                    mapped.close()
+                with open(path, mode="rb") as file:
+                    mapped = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+                self._maps[column] = mapped
+            raw[column] = memoryview(mapped)
+
+        rows = min(len(view) // struct.calcsize(COLUMNS[column]) for column, view in raw.items())
+        columns: Dict[str, memoryview] = {}
+        for column, view in raw.items():
+            fmt = COLUMNS[column]
+            columns[column] = view[: rows * struct.calcsize(fmt)].cast(fmt)
+            view.release()
+        return columns
+
+    @staticmethod
+    def release(columns: Optional[Dict[str, memoryview]]) -> None:
+        """Release the views of read, so the maps can be closed
+
+        Args:
+            columns (Optional[Dict[str, memoryview]]): Views returned by read
+        """
+        for view in (columns or {}).values():
+            view.release()
+
+    def close(self) -> None:
+        """Close all open files and maps"""
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+        self.close_maps()
+
+    def close_maps(self) -> None:
+        """Close the maps of read. The next read maps the columns again"""
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+
+class HistoryStore:
+    """Probe history of all Services in time segments.
+
+    Every member (worker or node) writes only to its own subdirectory with its own service ids, so several
+    members can share one history directory. Queries read the segments of all members. A query can run in a
+    other thread than the appends.
+
+    Args:
+        path (Path): Directory of the history
+        member_id (str): Id of this member, used as name of the own subdirectory
+        segment_seconds (int): Time range of one segment
+        retention_seconds (float): Segments older than this are deleted
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        member_id: str = "default",
+        segment_seconds: int = 86400,
+        retention_seconds: float = 90 * 86400,
+    ) -> None:
+        self.path = path
+        self.segment_seconds = segment_seconds
+        self.retention_seconds = retention_seconds
+        self.member_path = self.path / re.sub(r"[^\w.-]", "_", member_id)
+        self.member_path.mkdir(parents=True, exist_ok=True)
+        self._ids_path = self.member_path / "services.json"
+        self._ids: Dict[str, int] = self._read_ids(self.member_path)
+        # Segment path -> Segment of all members. Only the current segment keeps its maps between the queries
+        self.segments: Dict[Path, Segment] = {}
+        self._current: Optional[Segment] = None
+        # Member directory -> ((inode, mtime, size), name -> id, id -> name) of the id files of the other members
+        self._member_ids: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, int], Dict[int, str]]] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "HistoryStore":
+        """Open the history with the history settings
+
+        Args:
+            settings (Settings): Settings with a history_path
+
+        Returns:
+            HistoryStore: Opened history
+        """
+        return cls(
+            Path(settings.history_path).absolute(),
+            member_id=settings.member_id(),
+            segment_seconds=settings.history_segment_seconds,
+            retention_seconds=settings.history_retention_days * 86400,
+        )
+
+    @staticmethod
+    def _read_ids(member_path: Path) -> Dict[str, int]:
+        try:
+            return get_json_data(member_path / "services.json")
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            logger.error("Could not read the service ids of %s: %s", member_path, error)
+            return {}
+
+    def service_id(self, name: str) -> int:
+        """Get the id of a Service. A new id is created and saved for unknown Services
+
+        Args:
+            name (str): Name of the Service
+
+        Returns:
+            int: Id of the Service in the service column of this member
+        """
+        key = name.lower()
+        service_id = self._ids.get(key)
+        if service_id is None:
+            service_id = self._ids[key] = len(self._ids)
+            set_json_data(self._ids, self._ids_path)
+        return service_id
+
+    def append(self, name: str, latency: Optional[float], status: int, timestamp: float = None) -> None:
+        """Save one probe result
+
+        Args:
+            name (str): Name of the Service
+            latency (Optional[float]): Response time in seconds, None if the Service was not reachable
+            status (int): HTTP status code, 0 if the Service was not reachable
+            timestamp (float, optional): Unix time of the probe. Defaults to the current time
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        start = int(timestamp // self.segment_seconds * self.segment_seconds)
+        with self._lock:
+            if self._current is None or self._current.start != start:
+                self._rotate(start, timestamp)
+            self._current.append(timestamp, self.service_id(name), math.nan if latency is None else latency, status)
+
+    def _rotate(self, start: int, now: float) -> None:
+        if self._current is not None:
+            self._current.close()
+        self.apply_retention(now)
+        self._current = self._segment(self.member_path / f"{start:012d}", start)
+        self._current.open_append()
+        # The directory of a idle member can be removed by the retention of a other member
+        if self._ids and not self._ids_path.exists():
+            set_json_data(self._ids, self._ids_path)
+
+    def _segment(self, path: Path, start: int) -> Segment:
+        segment = self.segments.get(path)
+        if segment is None:
+            segment = self.segments[path] = Segment(path, start)
+        return segment
+
+    def _scan(self) -> Dict[Path, List[Segment]]:
+        """Find the segments of all members
+
+        Returns:
+            Dict[Path, List[Segment]]: Member directory -> segments ordered by the start
+        """
+        members: Dict[Path, List[Segment]] = {}
+        for member_path in self.path.iterdir():
+            if not member_path.is_dir():
+                continue
+            segments = [
+                self._segment(segment_path, int(segment_path.name))
+                for segment_path in member_path.iterdir()
+                if segment_path.is_dir() and segment_path.name.isdigit()
+            ]
+            members[member_path] = sorted(segments, key=lambda segment: segment.start)
+
+        # Forget the segments that the retention of a other member deleted, open maps would keep the files on disk
+        found = {segment.path for segments in members.values() for segment in segments}
+        for path in [path for path in self.segments if path not in found]:
+            segment = self.segments.pop(path)
+            segment.close()
+            if segment is self._current:
+                self._current = None
+        for member_path in [path for path in self._member_ids if path not in members]:
+            del self._member_ids[member_path]
+        return members
+
+    def _ids_of(self, member_path: Path) -> Tuple[Dict[str, int], Dict[int, str]]:
+        """Get the service ids of a member. The files of the other members are only read again if they changed
+
+        Args:
+            member_path (Path): Directory of the member
+
+        Returns:
+            Tuple[Dict[str, int], Dict[int, str]]: name -> id and id -> name
+        """
+        if member_path == self.member_path:
+            return dict(self._ids), {service_id: name for name, service_id in self._ids.items()}
+        try:
+            file_stat = (member_path / "services.json").stat()
+        except FileNotFoundError:
+            return {}, {}
+        version = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        cached = self._member_ids.get(member_path)
+        if cached is None or cached[0] != version:
+            ids = self._read_ids(member_path)
+            cached = (version, ids, {service_id: name for name, service_id in ids.items()})
+            self._member_ids[member_path] = cached
+        return cached[1], cached[2]
+
+    def apply_retention(self, now: float = None) -> List[Path]:
+        """Delete the segments of all members that end before the retention time
+
+        Args:
+            now (float, optional): Current Unix time. Defaults to the current time
+
+        Returns:
+            List[Path]: Deleted segments
+        """
+        now = time.time() if now is None else now
+        deleted: List[Path] = []
+        with self._lock:
+            for member_path, segments in self._scan().items():
+                for segment in segments:
+                    if segment.start + self.segment_seconds > now - self.retention_seconds:
+                        break
+                    self.segments.pop(segment.path, None)
+                    segment.close()
+                    if segment is self._current:
+                        self._current = None
+                    shutil.rmtree(segment.path, ignore_errors=True)
+                    deleted.append(segment.path)
+                # Remove the directories of old members without any segment
+                if member_path != self.member_path and not any(path.is_dir() for path in member_path.iterdir()):
+                    shutil.rmtree(member_path, ignore_errors=True)
+        return deleted
+
+    def query(
+        self, start: float, end: float, name: str = None, limit: int = None, newest: bool = False
+    ) -> List[ProbeSample]:
+        """Get the samples of all members in the time range [start, end]. Blocks while reading the segments,
+        so call it in a thread from async code
+
+        Args:
+            start (float): Unix time of the oldest sample
+            end (float): Unix time of the newest sample
+            name (str, optional): Only samples of this Service. Defaults to all Services
+            limit (int, optional): Maximal number of samples
+            newest (bool, optional): Keep the newest samples if there are more than limit. Defaults to the oldest
+
+        Returns:
+            List[ProbeSample]: Samples ordered by the time
+        """
+        # Segment start -> [(segment, id -> name, id of the requested service)]
+        by_start: Dict[int, List[Tuple[Segment, Dict[int, str], Optional[int]]]] = {}
+        with self._lock:
+            for member_path, segments in self._scan().items():
+                ids, names = self._ids_of(member_path)
+                service_id = None
+                if name is not None:
+                    service_id = ids.get(name.lower())
+                    if service_id is None:
+                        continue
+                for segment in segments:
+                    if segment.start + self.segment_seconds <= start or segment.start > end:
+                        continue
+                    by_start.setdefault(segment.start, []).append((segment, names, service_id))
+
+        # Sorted rows per segment start, in the order the segments are read
+        chunks: List[List[Row]] = []
+        count = 0
+        for segment_start in sorted(by_start, reverse=newest):
+            remaining = None if limit is None else limit - count
+            found: List[Row] = []
+            for segment, names, service_id in by_start[segment_start]:
+                # Only the reading is locked, a append waits for one segment at most
+                with self._lock:
+                    found += self._read_segment(segment, start, end, names, service_id, remaining, newest)
+                    # Old segments are rarely read again, do not keep a file descriptor per column open
+                    if segment is not self._current:
+                        segment.close_maps()
+            chunks.append(sorted(found, key=lambda row: row[0]))
+            count += len(found)
+            if limit is not None and count >= limit:
+                break
+
+        if newest:
+            chunks.reverse()
+        rows = [row for chunk in chunks for row in chunk]
+        if limit is not None and len(rows) > limit:
+            rows = rows[-limit:] if newest else rows[:limit]
+        return [
+            ProbeSample(name=service, timestamp=timestamp, latency=latency, status=status)
+            for timestamp, service, latency, status in rows
+        ]
+
+    @staticmethod
+    def _read_segment(
+        segment: Segment,
+        start: float,
+        end: float,
+        names: Dict[int, str],
+        service_id: Optional[int],
+        limit: Optional[int],
+        newest: bool,
+    ) -> List[Row]:
+        """Read the matching rows of one segment. Only the returned rows are converted
+
+        Args:
+            segment (Segment): Segment to read
+            start (float): Unix time of the oldest row
+            end (float): Unix time of the newest row
+            names (Dict[int, str]): id -> name of the member of the segment
+            service_id (Optional[int]): Only rows of this Service. None for all Services
+            limit (Optional[int]): Maximal number of rows
+            newest (bool): Take the newest rows if there are more than limit
+
+        Returns:
+            List[Row]: Rows ordered by the time
+        """
+        columns = segment.read()
+        if columns is None:
+            return []
+        try:
+            timestamps, services = columns["timestamp"], columns["service"]
+            latencies, statuses = columns["latency"], columns["status"]
+            matches: Iterable[int] = range(bisect_left(timestamps, start), bisect_right(timestamps, end))
+            if newest:
+                matches = reversed(matches)
+            if service_id is not None:
+                matches = (row for row in matches if services[row] == service_id)
+            selected = list(islice(matches, limit))
+            if newest:
+                selected.reverse()
+            return [
+                (
+                    timestamps[row],
+                    names.get(services[row], str(services[row])),
+                    None if math.isnan(latencies[row]) else latencies[row],
+                    statuses[row],
+                )
+                for row in selected
+            ]
+        finally:
+            Segment.release(columns)
+
+    def close(self) -> None:
+        """Close all segments"""
+        with self._lock:
+            for segment in self.segments.values():
+                segment.close()
+            self._current = None
+
+
+store: Optional[HistoryStore] = None
+
+
+def start(settings: Settings) -> None:
+    """Open the history if a history path is configured
+
+    Args:
+        settings (Settings): Settings of the Dashboard
+    """
+    global store
+    if settings.history_path and store is None:
+        store = HistoryStore.from_settings(settings)
+        store.apply_retention()
+
+
+def stop() -> None:
+    """Close the history"""
+    global store
+    if store is not None:
+        store.close()
+        store = None
+
+
+def record(name: str, latency: Optional[float], status: int) -> None:
+    """Save one probe result. Does nothing if the history is disabled
+
+    Args:
+        name (str): Name of the Service
+        latency (Optional[float]): Response time in seconds, None if the Service was not reachable
+        status (int): HTTP status code, 0 if the Service was not reachable
+    """
+    if store is not None:
+        try:
+            store.append(name, latency, status)
+        except OSError as error:
+            logger.error("Could not save the probe result of %s: %s", name, error)
@@ -0,0 +1,70 @@
+"""Startup and shutdown of the backend services"""
+import time
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from typing import Dict
+
+from models.health import Readiness
+from models.settings import Settings
+
+from services import alert_service, history_service, probe_service, profiler_service, uptimer_service
+
+ready = False
+import_seconds = 0.0
+startup_seconds = 0.0
+steps: Dict[str, float] = {}
+
+
+def _measure(name: str, since: float) -> float:
+    now = time.perf_counter()
+    steps[name] = now - since
+    return now
+
+
+async def startup(settings: Settings) -> None:
+    """Configure and warm up all services, then mark the app as ready
+
+    Args:
+        settings (Settings): Settings of the Dashboard
+    """
+    global ready, startup_seconds
+    started = step = time.perf_counter()
+
+    uptimer_service.configure(Path(settings.services_path))
+    try:
+        uptimer_service.get_services()
+    except JSONDecodeError:
+        # New config without services, nothing to warm up
+        pass
+    step = _measure("registry", step)
+    await uptimer_service.open_client()
+    step = _measure("http_pool", step)
+    profiler_service.configure(settings)
+    history_service.start(settings)
+    step = _measure("history", step)
+    await alert_service.start(settings)
+    step = _measure("alerts", step)
+    await probe_service.start(settings)
+    _measure("probes", step)
+
+    startup_seconds = time.perf_counter() - started
+    ready = True
+
+
+async def shutdown() -> None:
+    """Stop the background tasks, deliver the remaining alerts and close all resources"""
+    global ready
+    ready = False
+    await probe_service.stop()
+    await alert_service.stop()
+    history_service.stop()
+    await uptimer_service.close_client()
+
+
+def readiness() -> Readiness:
+    """Get the state of the startup
+
+    Returns:
+        Readiness: If the app is ready and how long the startup took
+    """
+    return Readiness(ready=ready, import_seconds=import_seconds, startup_seconds=startup_seconds, steps=steps)
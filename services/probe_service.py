@@ -0,0 +1,260 @@
+"""Automatic probing of the Services, sharded across all running workers.
+
+Every worker registers itself with a heartbeat in a shared SQLite file. The Services with ping enabled are
+distributed over the live workers by consistent hashing of the service name, so every Service is probed by
+exactly one worker and only a small part of the Services moves if a worker joins or leaves.
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from bisect import bisect
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from models.service import ConfigService, PingService
+from models.service_error import ServiceError
+from models.settings import Settings
+
+from services import uptimer_service
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring of the members
+
+    Args:
+        members (Sequence[str]): Ids of the members
+        vnodes (int): Points on the ring per member for a even distribution
+    """
+
+    def __init__(self, members: Sequence[str], vnodes: int = 64) -> None:
+        self.members = sorted(set(members))
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Get the member that is responsible for the key
+
+        Args:
+            key (str): Key to look up, for example the name of a Service
+
+        Returns:
+            Optional[str]: Id of the member, None if the ring is empty
+        """
+        if not self._hashes:
+            return None
+        index = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class Membership:
+    """Live members in a shared SQLite file
+
+    Args:
+        path (Path): SQLite file shared by all members
+        member_id (str): Id of this member
+        ttl (float): Members without a heartbeat in this time are removed
+    """
+
+    def __init__(self, path: Path, member_id: str, ttl: float = 30.0) -> None:
+        self.path = path
+        self.member_id = member_id
+        self.ttl = ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=self.ttl)
+        connection.execute("CREATE TABLE IF NOT EXISTS members (id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+        return connection
+
+    def heartbeat(self, now: float = None) -> List[str]:
+        """Refresh the heartbeat of this member and remove the expired members
+
+        Args:
+            now (float, optional): Current Unix time. Defaults to the current time
+
+        Returns:
+            List[str]: Ids of all live members
+        """
+        now = time.time() if now is None else now
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO members (id, heartbeat) VALUES (?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (self.member_id, now),
+                )
+                connection.execute("DELETE FROM members WHERE heartbeat < ?", (now - self.ttl,))
+            return [row[0] for row in connection.execute("SELECT id FROM members ORDER BY id")]
+        finally:
+            connection.close()
+
+    def leave(self) -> None:
+        """Remove this member, so the other members take over its Services"""
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM members WHERE id = ?", (self.member_id,))
+        finally:
+            connection.close()
+
+
+class ProbeScheduler:
+    """Ping all Services with ping enabled that belong to this member in a fixed interval
+
+    Args:
+        membership (Membership): Shared membership of all workers
+        interval (float): Time in seconds between two probe rounds
+        heartbeat_interval (float): Time in seconds between two heartbeats
+        concurrency (int): Maximal number of parallel pings
+    """
+
+    def __init__(
+        self, membership: Membership, interval: float = 60.0, heartbeat_interval: float = 10.0, concurrency: int = 50
+    ) -> None:
+        self.membership = membership
+        self.interval = interval
+        self.heartbeat_interval = heartbeat_interval
+        self.ring = HashRing([membership.member_id])
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ProbeScheduler":
+        """Create the scheduler with the probe settings
+
+        Args:
+            settings (Settings): Settings of the Dashboard
+
+        Returns:
+            ProbeScheduler: Not started scheduler
+        """
+        membership = Membership(
+            Path(settings.shard_store).absolute(), settings.member_id(), ttl=settings.shard_member_ttl
+        )
+        return cls(
+            membership,
+            interval=settings.probe_interval,
+            heartbeat_interval=settings.shard_heartbeat_interval,
+            concurrency=settings.probe_concurrency,
+        )
+
+    def owned(self, services: List[ConfigService]) -> List[ConfigService]:
+        """Filter the Services that this member has to probe
+
+        Args:
+            services (List[ConfigService]): All configured Services
+
+        Returns:
+            List[ConfigService]: Services with ping enabled that belong to this member
+        """
+        member_id = self.membership.member_id
+        return [service for service in services if service.ping and self.ring.owner(service.name.lower()) == member_id]
+
+    async def refresh(self) -> None:
+        """Send a heartbeat and rebuild the ring if the members changed"""
+        members = await asyncio.to_thread(self.membership.heartbeat)
+        if members != self.ring.members:
+            logger.info("Probe members changed to %s", members)
+            self.ring = HashRing(members)
+
+    async def probe(self, service: ConfigService) -> bool:
+        """Ping one Service if it still belongs to this member. The result is handled by the ping_service
+
+        Args:
+            service (ConfigService): Service to ping
+
+        Returns:
+            bool: False if the Service moved to a other member since the round started
+        """
+        async with self._semaphore:
+            # The ring can change while the round waits for the semaphore
+            if self.ring.owner(service.name.lower()) != self.membership.member_id:
+                return False
+            try:
+                await uptimer_service.ping_service(
+                    PingService(name=service.name, url=service.url), configured=True, alert=True
+                )
+            except ServiceError:
+                pass
+            return True
+
+    async def probe_round(self) -> int:
+        """Ping all Services of this member once
+
+        Returns:
+            int: Number of pinged Services
+        """
+        services = self.owned(await asyncio.to_thread(uptimer_service.get_services))
+        return sum(await asyncio.gather(*(self.probe(service) for service in services)))
+
+    async def start(self) -> None:
+        """Join the members and start the background tasks"""
+        if not self._tasks:
+            await self.refresh()
+            self._tasks = [asyncio.create_task(self._heartbeat_loop()), asyncio.create_task(self._probe_loop())]
+
+    async def stop(self) -> None:
+        """Stop the background tasks and leave the members"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.membership.leave)
+
+    async def _try_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except sqlite3.Error as error:
+            logger.warning("Heartbeat failed: %s", error)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self._try_refresh()
+
+    async def _probe_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Workers that boot together only see themselves on the first heartbeat. Wait until all of them
+        # had the chance to join, otherwise every early worker probes all Services in the first round
+        await asyncio.sleep(self.heartbeat_interval)
+        while True:
+            started = loop.time()
+            await self._try_refresh()
+            try:
+                await self.probe_round()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Probe round failed: %s", error)
+            await asyncio.sleep(max(self.interval - (loop.time() - started), 0))
+
+
+scheduler: Optional[ProbeScheduler] = None
+
+
+async def start(settings: Settings) -> None:
+    """Create and start the scheduler if the automatic probing is enabled
+
+    Args:
+        settings (Settings): Settings of the Dashboard
+    """
+    global scheduler
+    if settings.probe_enabled and scheduler is None:
+        scheduler = ProbeScheduler.from_settings(settings)
+        await scheduler.start()
+
+
+async def stop() -> None:
+    """Stop the scheduler"""
+    global scheduler
+    if scheduler is not None:
+        await scheduler.stop()
+        scheduler = None
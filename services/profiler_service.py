@@ -0,0 +1,293 @@
+"""Sampling wall-time profiler for single requests of the API"""
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from models.profile import RouteProfile, StackSample
+from models.settings import Settings
+
+Stack = Tuple[str, ...]
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_filename}:{code.co_name}:{frame.f_lineno}"
+
+
+def _await_stack(coro) -> List[FrameType]:
+    """Get the frames of a suspended coroutine by following the awaited coroutines
+
+    Args:
+        coro: Coroutine of the task
+
+    Returns:
+        List[FrameType]: Frames from the outermost to the innermost coroutine
+    """
+    frames: List[FrameType] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+class RouteStats:
+    """Collected samples of one route
+
+    Args:
+        max_stacks (int): Number of stacks to keep. Rare stacks are dropped first
+    """
+
+    def __init__(self, max_stacks: int) -> None:
+        self.max_stacks = max_stacks
+        self.requests = 0
+        self.wall_time = 0.0
+        self.stacks: Counter = Counter()
+
+    def add(self, stacks: Counter, wall_time: float) -> None:
+        self.requests += 1
+        self.wall_time += wall_time
+        self.stacks.update(stacks)
+        # Trim only when the buffer is twice as large to keep the trimming cheap
+        if len(self.stacks) > 2 * self.max_stacks:
+            self.stacks = Counter(dict(self.stacks.most_common(self.max_stacks)))
+
+
+class ProfiledRequest:
+    """One request that is currently sampled
+
+    Args:
+        task (asyncio.Task): Task that handle the request
+        thread_id (int): Thread of the event loop of the task
+    """
+
+    def __init__(self, task: asyncio.Task, thread_id: int) -> None:
+        self.task = task
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+
+
+class Profiler:
+    """Samples the stacks of the profiled requests from a background thread.
+
+    A request is sampled with the frames of the thread if its task is running, otherwise with the chain of awaited
+    coroutines. So the time a request waits for I/O is also visible in the stacks.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.01,
+        interval: float = 0.005,
+        max_stacks: int = 20,
+        max_routes: int = 100,
+        header: str = "X-Profile",
+        header_enabled: bool = False,
+    ) -> None:
+        self.enabled = enabled
+        self.header = header.lower().encode("latin-1")
+        self.header_enabled = header_enabled and bool(header)
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_routes = max_routes
+        self.routes: Dict[str, RouteStats] = {}
+        self._active: Dict[int, ProfiledRequest] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "Profiler":
+        """Create the Profiler with the profile settings
+
+        Args:
+            settings (Settings): Settings of the Dashboard
+
+        Returns:
+            Profiler: Profiler without running requests
+        """
+        return cls(
+            enabled=settings.profile_enabled,
+            sample_rate=settings.profile_sample_rate,
+            interval=settings.profile_interval,
+            max_stacks=settings.profile_max_stacks,
+            max_routes=settings.profile_max_routes,
+            header=settings.profile_header,
+            header_enabled=settings.profile_header_enabled,
+        )
+
+    def should_profile(self) -> bool:
+        """Decide if the next request is profiled by the configured sample rate
+
+        Returns:
+            bool: True if the request should be profiled
+        """
+        return self.enabled and random.random() < self.sample_rate
+
+    def begin(self) -> ProfiledRequest:
+        """Start to sample the current task. Must be called inside the event loop
+
+        Returns:
+            ProfiledRequest: Handle to finish the profile
+        """
+        request = ProfiledRequest(asyncio.current_task(), threading.get_ident())
+        with self._lock:
+            self._active[id(request)] = request
+            self._ensure_thread()
+            self._wakeup.set()
+        return request
+
+    def end(self, request: ProfiledRequest, route: str) -> None:
+        """Stop to sample the request and add the samples to the route
+
+        Args:
+            request (ProfiledRequest): Handle of begin
+            route (str): Name of the route for the request
+        """
+        wall_time = time.perf_counter() - request.started
+        with self._lock:
+            self._active.pop(id(request), None)
+            if not self._active:
+                self._wakeup.clear()
+            stats = self.routes.get(route)
+            if stats is None:
+                if len(self.routes) >= self.max_routes:
+                    return
+                stats = self.routes[route] = RouteStats(self.max_stacks)
+            stats.add(request.stacks, wall_time)
+
+    def clear(self) -> None:
+        """Remove all collected samples"""
+        with self._lock:
+            self.routes.clear()
+
+    def report(self) -> List[RouteProfile]:
+        """Get the top stacks of all routes
+
+        Returns:
+            List[RouteProfile]: Profiles sorted by the total wall time
+        """
+        with self._lock:
+            routes = [(route, stats.requests, stats.wall_time, stats.stacks.most_common(self.max_stacks))
+                      for route, stats in self.routes.items()]
+        profiles = [
+            RouteProfile(
+                route=route,
+                requests=requests,
+                wall_time=wall_time,
+                stacks=[
+                    StackSample(stack=list(stack), samples=samples, seconds=samples * self.interval)
+                    for stack, samples in stacks
+                ],
+            )
+            for route, requests, wall_time, stacks in routes
+        ]
+        return sorted(profiles, key=lambda profile: profile.wall_time, reverse=True)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            self._sample()
+
+    def _sample(self) -> None:
+        with self._lock:
+            requests = list(self._active.values())
+        if not requests:
+            return
+        thread_frames = sys._current_frames()  # pylint: disable=protected-access
+        samples = [(request, self._task_stack(request, thread_frames.get(request.thread_id))) for request in requests]
+        # The stacks are counted under the lock, so end does not merge a Counter that is changed at the same time.
+        # Requests that ended while the stacks were taken are skipped
+        with self._lock:
+            for request, stack in samples:
+                if stack and self._active.get(id(request)) is request:
+                    request.stacks[stack] += 1
+
+    @staticmethod
+    def _task_stack(request: ProfiledRequest, thread_frame: Optional[FrameType]) -> Stack:
+        coro = request.task.get_coro()
+        task_frame = getattr(coro, "cr_frame", None)
+        if task_frame is None:
+            return ()
+
+        # Running task: take the frames of the thread up to the coroutine of the task
+        frames: List[FrameType] = []
+        frame = thread_frame
+        while frame is not None:
+            frames.append(frame)
+            if frame is task_frame:
+                return tuple(_frame_name(f) for f in reversed(frames))
+            frame = frame.f_back
+
+        # Suspended task: follow the awaited coroutines
+        return tuple(_frame_name(f) for f in _await_stack(coro))
+
+
+profiler = Profiler()
+
+
+def configure(settings: Settings) -> None:
+    """Replace the Profiler with one configured by the settings
+
+    Args:
+        settings (Settings): Settings of the Dashboard
+    """
+    global profiler
+    profiler = Profiler.from_settings(settings)
+
+
+class ProfilerMiddleware:
+    """ASGI middleware to profile a fraction of the requests or requests with the profile header.
+    The header is ignored unless it is enabled in the Profiler.
+
+    The settings are taken from the current Profiler on every request, so it can be configured on startup.
+    If a request is not profiled the middleware only checks the header, so the overhead stays near zero.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        current = profiler
+        if scope["type"] != "http" or not (
+            current.should_profile() or (current.header_enabled and self._requested(scope, current.header))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = current.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current.end(request, self._route_name(scope))
+
+    @staticmethod
+    def _requested(scope, header: bytes) -> bool:
+        for key, value in scope["headers"]:
+            if key == header:
+                return value not in (b"", b"0", b"false")
+        return False
+
+    @staticmethod
+    def _route_name(scope) -> str:
+        endpoint = scope.get("endpoint")
+        app = scope.get("app")
+        for route in getattr(app, "routes", []):
+            if getattr(route, "endpoint", None) is endpoint and endpoint is not None:
+                return f"{scope['method']} {route.path}"
+        return f"{scope['method']} <unmatched>"
@@ -1,13 +1,88 @@
 """Backend manager for the Services"""
+import secrets
 from json.decoder import JSONDecodeError
-from typing import List
+from pathlib import Path
+from typing import List, Optional
 
 import httpx
 from httpx import Response
-from models.service import ConfigService, PingService, Service
-from models.service_error import PingError, ServiceDuplicate, ServiceNotFound
+from models.service import ConfigService, PingService, Service, ServicePatch, VersionedService
+from models.service_error import PingError, ServiceDuplicate, ServiceNotFound, ServiceVersionConflict
 
-from services import get_conf_services, safe_conf_services, services_path
+from services import (
+    alert_service,
+    config_lock,
+    get_conf_services,
+    get_versioned_services,
+    history_service,
+    safe_conf_services,
+    services_path,
+    set_services_path,
+)
+
+# Shared connection pool for the pings, opened on startup
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def configure(path: Path) -> None:
+    """Use the given service configuration. The file is created if it does not exist
+
+    Args:
+        path (Path): Path to the JSON-Config
+    """
+    global services_path
+    path = Path(path).absolute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch(exist_ok=True)
+    services_path = path
+    set_services_path(path)
+
+
+async def open_client() -> httpx.AsyncClient:
+    """Open the shared connection pool for the pings
+
+    Returns:
+        httpx.AsyncClient: Shared client
+    """
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient()
+    return http_client
+
+
+async def close_client() -> None:
+    """Close the shared connection pool"""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def _read_versioned() -> List[VersionedService]:
+    # Only called under the config_lock, the cache could miss a write of a other worker
+    try:
+        return get_versioned_services(services_path, use_cache=False)
+    except JSONDecodeError:
+        return []
+
+
+def _find(services: List[VersionedService], name: str) -> Optional[int]:
+    for index, service in enumerate(services):
+        if service.name.lower() == name.lower():
+            return index
+    return None
+
+
+def _new_version() -> int:
+    # Random instead of counting, a counter starts again after delete and add. Below 2**53 to stay exact in JavaScript
+    return secrets.randbelow(2**53 - 2) + 2
+
+
+def _check_version(service: VersionedService, version: Optional[int]) -> None:
+    if version is not None and service.version != version:
+        raise ServiceVersionConflict(
+            f"Service has version {service.version}, the change is for version {version}", 412, service
+        )
 
 
 def add_service(service: ConfigService) -> ConfigService:
@@ -22,18 +97,13 @@ def add_service(service: ConfigService) -> ConfigService:
     Returns:
         ConfigService: Added service
     """
-    try:
-        get_service(service.name)
-    except ServiceNotFound:
-        conf_services = get_services()
-        conf_services.append(service)
+    with config_lock(services_path):
+        conf_services = _read_versioned()
+        if _find(conf_services, service.name) is not None:
+            raise ServiceDuplicate("Service Name is already in the configuration", 409, service)
+        conf_services.append(VersionedService(**service.dict(exclude={"version"}), version=_new_version()))
         safe_conf_services(conf_services, services_path)
-        return service
-    except JSONDecodeError:
-        safe_conf_services([service], services_path)
-        return service
-    else:
-        raise ServiceDuplicate("Service Name is already in the configuration", 409, service)
+    return service
 
 
 def delete_service(service: Service) -> ConfigService:
@@ -45,11 +115,14 @@ def delete_service(service: Service) -> ConfigService:
     Returns:
         ConfigService: Return Service if success
     """
-    service = get_service(service.name)
-    conf_services = get_services()
-    conf_services.remove(service)
-    safe_conf_services(conf_services, services_path)
-    return service
+    with config_lock(services_path):
+        conf_services = _read_versioned()
+        index = _find(conf_services, service.name)
+        if index is None:
+            raise ServiceNotFound("Der Service wurde nicht in der Configuration gefunden", 404, service.name)
+        deleted = conf_services.pop(index)
+        safe_conf_services(conf_services, services_path)
+    return ConfigService(**deleted.dict(exclude={"version"}))
 
 
 def get_services() -> List[ConfigService]:
@@ -81,11 +154,34 @@ def get_service(name: str) -> ConfigService:
     raise ServiceNotFound("Der Service wurde nicht in der Configuration gefunden", 404, name)
 
 
-async def ping_service(service: PingService) -> PingService:
-    """Ping the Service with the given url or search for the url in the service configuration
+def get_versioned_service(name: str) -> VersionedService:
+    """Get a Service with the version from the Config
+
+    Args:
+        name (str): Name of the Service
+
+    Raises:
+        ServiceNotFound: If the Service can not be found
+
+    Returns:
+        VersionedService: Found Service with the current version
+    """
+    conf_services = get_versioned_services(services_path)
+    index = _find(conf_services, name)
+    if index is None:
+        raise ServiceNotFound("Der Service wurde nicht in der Configuration gefunden", 404, name)
+    return conf_services[index]
+
+
+async def ping_service(service: PingService, configured: bool = False, alert: bool = False) -> PingService:
+    """Ping the Service with the given url or search for the url in the service configuration.
+    Only configured Services are saved to the history, ad-hoc pings with a url are not
 
     Args:
         service (PingService): Services to check
+        configured (bool, optional): The given url is the one of the service configuration. Defaults to False
+        alert (bool, optional): Report the result to the alerts. Only set by the ProbeScheduler of the member that
+            owns the Service, so every worker does not alert on its own. Defaults to False
 
     Raises:
         PingError: Error if status_code >= 400
@@ -97,48 +193,85 @@ async def ping_service(service: PingService) -> PingService:
     if service.url is None:
         conf_service: ConfigService = get_service(service.name)
         service = PingService(**dict(conf_service))
+        configured = True
     try:
-        async with httpx.AsyncClient() as client:
-            resp: Response = await client.get(service.url)
-            resp.raise_for_status()
-            service.response_time = resp.elapsed.total_seconds()
-            return service
+        if http_client is None:
+            async with httpx.AsyncClient() as client:
+                resp: Response = await client.get(service.url)
+        else:
+            resp = await http_client.get(service.url)
+        resp.raise_for_status()
+        service.response_time = resp.elapsed.total_seconds()
+        if alert:
+            alert_service.observe(service.name, up=True)
+        if configured:
+            history_service.record(service.name, service.response_time, resp.status_code)
+        return service
     except httpx.HTTPStatusError as error:
+        if alert:
+            alert_service.observe(service.name, up=False, error_msg=str(error))
+        if configured:
+            history_service.record(service.name, None, error.response.status_code)
         raise PingError(str(error), 404, service) from error
     except httpx.RequestError as error:
+        if alert:
+            alert_service.observe(service.name, up=False, error_msg=str(error))
+        if configured:
+            history_service.record(service.name, None, 0)
         raise PingError(str(error), 408, service) from error
 
 
-def update_service(old_service: Service, updated_service: ConfigService) -> ConfigService:
+def update_service(old_service: Service, updated_service: ConfigService, version: int = None) -> VersionedService:
     """Update the setting of one service. Also can change the name of the service if not already exist
 
     Args:
         old_service (Service): The that need to be updated
         updated_service (ConfigService): The new configuration for the service
+        version (int, optional): Only update if the service still has this version
 
     Raises:
         ServiceNotFound: If the Service to update is not in the configuration
+        ServiceDuplicate: If the new name is already used by a other service
+        ServiceVersionConflict: If the service has not the given version
 
     Returns:
-        ConfigService: Updated settings
+        VersionedService: Updated settings with the new version
     """
-    updated = False
-    conf_services = get_services()
-    old_service = get_service(old_service.name)
-
-    if old_service.name != updated_service.name:
-        add_service(updated_service)
-        delete_service(old_service)
-        return updated_service
-
-    for index, conf_service in enumerate(conf_services):
-        if conf_service == old_service:
-            conf_services[index] = updated_service
-            updated = True
-            break
-    safe_conf_services(conf_services, services_path)
-
-    if not updated:
-        raise ServiceNotFound("Service to update not found", 404, updated_service)
-
-    return updated_service
+    changes = ServicePatch(**updated_service.dict(include={"name", "url", "ping"}))
+    return patch_service(old_service.name, changes, version)
+
+
+def patch_service(name: str, changes: ServicePatch, version: int = None) -> VersionedService:
+    """Change only the given fields of one service with a single write. A rename is done in the same write
+
+    Args:
+        name (str): Name of the service to change
+        changes (ServicePatch): Fields to change
+        version (int, optional): Only change if the service still has this version
+
+    Raises:
+        ServiceNotFound: If the Service to change is not in the configuration
+        ServiceDuplicate: If the new name is already used by a other service
+        ServiceVersionConflict: If the service has not the given version
+        InvalidURL: If the new url is not valid
+
+    Returns:
+        VersionedService: Changed service with the new version
+    """
+    with config_lock(services_path):
+        conf_services = _read_versioned()
+        index = _find(conf_services, name)
+        if index is None:
+            raise ServiceNotFound("Service to update not found", 404, Service(name=name))
+        current = conf_services[index]
+        _check_version(current, version)
+
+        fields = changes.dict(exclude_unset=True, exclude_none=True)
+        updated = VersionedService(**{**current.dict(), **fields, "version": _new_version()})
+        other = _find(conf_services, updated.name)
+        if other is not None and other != index:
+            raise ServiceDuplicate("Service Name is already in the configuration", 409, updated)
+
+        conf_services[index] = updated
+        safe_conf_services(conf_services, services_path)
+    return updated
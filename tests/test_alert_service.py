@@ -0,0 +1,125 @@
+import asyncio
+import json
+from typing import List
+
+import httpx
+import pytest
+from models.alert import Alert, AlertKind
+from pytest_httpx import HTTPXMock, to_response
+from services.alert_service import AlertPipeline
+
+WEBHOOK = "http://webhook.local/alerts"
+
+
+@pytest.fixture
+def pipeline() -> AlertPipeline:
+    return AlertPipeline(
+        WEBHOOK, confirm_after=2, flap_window=60, flap_threshold=4, batch_window=0.05, retry_backoff=0
+    )
+
+
+def test_state_change(pipeline: AlertPipeline):
+    # First confirmed state up is no alert
+    assert pipeline.observe("foo", True, now=0) is None
+    assert pipeline.observe("foo", True, now=1) is None
+
+    # Down needs to be confirmed
+    assert pipeline.observe("foo", False, "timeout", now=100) is None
+    alert = pipeline.observe("foo", False, "timeout", now=101)
+    assert alert == Alert(name="foo", kind=AlertKind.DOWN, timestamp=101, error_msg="timeout")
+
+    # No duplicate while down
+    assert pipeline.observe("foo", False, "timeout", now=102) is None
+
+    # Recovery
+    assert pipeline.observe("foo", True, now=200) is None
+    assert pipeline.observe("foo", True, now=201).kind == AlertKind.UP
+    assert pipeline.queue.qsize() == 2
+
+    # First confirmed state down is a alert
+    pipeline.observe("bar", False, now=0)
+    assert pipeline.observe("bar", False, now=1).kind == AlertKind.DOWN
+
+
+def test_flapping(pipeline: AlertPipeline):
+    pipeline.observe("foo", True, now=0)
+    pipeline.observe("foo", True, now=1)
+
+    alerts = [pipeline.observe("foo", i % 2 == 1, now=2 + i) for i in range(8)]
+    kinds = [alert.kind for alert in alerts if alert is not None]
+    assert kinds == [AlertKind.FLAPPING]
+
+    # Stable again after the flap window, the changed state is send
+    pipeline.observe("foo", False, now=100)
+    assert pipeline.observe("foo", False, now=101).kind == AlertKind.DOWN
+
+
+def test_queue_full():
+    pipeline = AlertPipeline(WEBHOOK, confirm_after=1, queue_size=1)
+    assert pipeline.observe("foo", False, now=0) is not None
+    assert pipeline.observe("bar", False, now=0) is None
+    assert pipeline.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_delivery(httpx_mock: HTTPXMock, pipeline: AlertPipeline):
+    received: List[dict] = []
+
+    def webhook(request: httpx.Request, extensions: dict):
+        received.append(json.loads(request.read()))
+        return to_response(status_code=200)
+
+    httpx_mock.add_callback(webhook, url=WEBHOOK)
+
+    await pipeline.start()
+    for i in range(20):
+        pipeline.observe(f"service{i}", False, "down", now=0)
+        pipeline.observe(f"service{i}", False, "down", now=1)
+    await pipeline.stop()
+
+    assert sum(batch["count"] for batch in received) == 20
+    assert len(received) < 20
+    assert all(len(batch["down"]) == batch["count"] for batch in received)
+
+
+@pytest.mark.asyncio
+async def test_stop_inside_batch_window(httpx_mock: HTTPXMock):
+    received: List[dict] = []
+
+    def webhook(request: httpx.Request, extensions: dict):
+        received.append(json.loads(request.read()))
+        return to_response(status_code=200)
+
+    httpx_mock.add_callback(webhook, url=WEBHOOK)
+    pipeline = AlertPipeline(WEBHOOK, confirm_after=1, batch_window=5)
+
+    await pipeline.start()
+    pipeline.observe("foo", False, now=0)
+    await asyncio.sleep(0.05)
+    # The worker holds the first Alert and waits for more in the batch window
+    assert pipeline.queue.empty()
+    assert len(pipeline.batch) == 1
+
+    pipeline.observe("bar", False, now=0)
+    await asyncio.wait_for(pipeline.stop(), timeout=1)
+
+    assert [alert["name"] for batch in received for alert in batch["down"]] == ["foo", "bar"]
+
+
+@pytest.mark.asyncio
+async def test_delivery_retry(httpx_mock: HTTPXMock, pipeline: AlertPipeline):
+    httpx_mock.add_response(status_code=503, url=WEBHOOK)
+    httpx_mock.add_response(status_code=200, url=WEBHOOK)
+    alerts = [Alert(name="foo", kind=AlertKind.DOWN, timestamp=0)]
+
+    assert await pipeline.deliver(alerts) is True
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_delivery_rejected(httpx_mock: HTTPXMock, pipeline: AlertPipeline):
+    httpx_mock.add_response(status_code=400, url=WEBHOOK)
+    alerts = [Alert(name="foo", kind=AlertKind.DOWN, timestamp=0)]
+
+    assert await pipeline.deliver(alerts) is False
+    assert len(httpx_mock.get_requests()) == 1
@@ -0,0 +1,154 @@
+from pathlib import Path
+
+import pytest
+from models.history import ProbeSample
+from pytest_mock import MockerFixture
+from services.history_service import HistoryStore
+
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> HistoryStore:
+    store = HistoryStore(tmp_path, segment_seconds=DAY, retention_seconds=30 * DAY)
+    yield store
+    store.close()
+
+
+def test_append_and_query(store: HistoryStore):
+    store.append("foo", 0.5, 200, timestamp=100)
+    store.append("bar", None, 0, timestamp=200)
+    store.append("foo", 0.25, 503, timestamp=DAY + 100)
+
+    assert store.query(0, 2 * DAY) == [
+        ProbeSample(name="foo", timestamp=100, latency=0.5, status=200),
+        ProbeSample(name="bar", timestamp=200, latency=None, status=0),
+        ProbeSample(name="foo", timestamp=DAY + 100, latency=0.25, status=503),
+    ]
+    assert [s.timestamp for s in store.query(150, 2 * DAY)] == [200, DAY + 100]
+    assert [s.timestamp for s in store.query(0, 2 * DAY, name="FOO")] == [100, DAY + 100]
+    assert [s.timestamp for s in store.query(0, 2 * DAY, limit=1)] == [100]
+    assert [s.timestamp for s in store.query(0, 2 * DAY, limit=2, newest=True)] == [200, DAY + 100]
+    assert [s.timestamp for s in store.query(0, 2 * DAY, name="foo", limit=1, newest=True)] == [DAY + 100]
+    assert store.query(0, 2 * DAY, name="unknown") == []
+    assert len(list(store.member_path.glob("*/timestamp.d"))) == 2
+
+
+def test_reopen(tmp_path: Path, store: HistoryStore):
+    for i in range(10):
+        store.append(f"service{i % 3}", i / 10, 200, timestamp=i)
+    store.close()
+
+    reopened = HistoryStore(tmp_path, segment_seconds=DAY)
+    assert len(reopened.query(0, DAY)) == 10
+    assert [s.name for s in reopened.query(0, DAY, name="service1")] == ["service1"] * 3
+
+    # Appending to a existing segment keeps the timestamps sorted
+    reopened.append("service0", 0.1, 200, timestamp=5)
+    assert reopened.query(0, DAY)[-1].timestamp == 9
+    reopened.close()
+
+
+def test_partial_row_ignored(store: HistoryStore):
+    store.append("foo", 0.5, 200, timestamp=100)
+    segment = store.segments[store.member_path / f"{0:012d}"]
+    with open(segment.column_path("timestamp"), mode="ab") as file:
+        file.write(b"\x00" * 8)
+
+    assert len(store.query(0, DAY)) == 1
+
+    # The partial row is cut before appending again
+    store.close()
+    store.append("foo", 0.25, 200, timestamp=200)
+    assert [s.latency for s in store.query(0, DAY)] == [0.5, 0.25]
+
+
+def test_retention(store: HistoryStore):
+    store.append("foo", 0.5, 200, timestamp=0)
+    store.append("foo", 0.5, 200, timestamp=10 * DAY)
+    assert len(list(store.member_path.iterdir())) == 3
+
+    # New segment after the retention time deletes the old segments
+    store.append("foo", 0.5, 200, timestamp=35 * DAY)
+    assert sorted(path.name for path in store.member_path.iterdir() if path.is_dir()) == [
+        f"{10 * DAY:012d}",
+        f"{35 * DAY:012d}",
+    ]
+    assert [s.timestamp for s in store.query(0, 40 * DAY)] == [10 * DAY, 35 * DAY]
+
+
+def test_shared_directory(tmp_path: Path):
+    first = HistoryStore(tmp_path, member_id="host:1", segment_seconds=DAY, retention_seconds=30 * DAY)
+    second = HistoryStore(tmp_path, member_id="host:2", segment_seconds=DAY, retention_seconds=30 * DAY)
+
+    # Every member has own ids, the names stay correct
+    first.append("alpha", 0.1, 200, timestamp=100)
+    second.append("beta", 0.2, 200, timestamp=150)
+    first.append("alpha", 0.3, 200, timestamp=200)
+
+    for store in (first, second):
+        assert [(s.name, s.timestamp) for s in store.query(0, DAY)] == [("alpha", 100), ("beta", 150), ("alpha", 200)]
+        assert [s.timestamp for s in store.query(0, DAY, name="beta")] == [150]
+
+    # Retention removes the segments and the directory of a old member
+    first.append("alpha", 0.1, 200, timestamp=40 * DAY)
+    assert not (tmp_path / "host_2").exists()
+    assert [s.name for s in second.query(0, 50 * DAY)] == ["alpha"]
+
+    # The old member can write again with the same ids
+    second.append("beta", 0.2, 200, timestamp=41 * DAY)
+    assert [s.name for s in first.query(0, 50 * DAY)] == ["alpha", "beta"]
+
+    first.close()
+    second.close()
+
+
+def test_retention_of_other_member(tmp_path: Path):
+    first = HistoryStore(tmp_path, member_id="first", segment_seconds=DAY, retention_seconds=30 * DAY)
+    second = HistoryStore(tmp_path, member_id="second", segment_seconds=DAY, retention_seconds=30 * DAY)
+    for day in range(3):
+        first.append("foo", 0.5, 200, timestamp=day * DAY)
+        second.append("bar", 0.5, 200, timestamp=day * DAY)
+    assert len(second.query(0, 3 * DAY)) == 6
+    # Only the current segment keeps its maps after a query
+    assert [segment.path.name for segment in second.segments.values() if segment._maps] == [f"{2 * DAY:012d}"]
+
+    # The retention of the first member deletes the segments, the second member forgets them on the next query
+    first.append("foo", 0.5, 200, timestamp=40 * DAY)
+    assert [s.name for s in second.query(0, 50 * DAY)] == ["foo"]
+    assert list(second.segments) == [tmp_path / "first" / f"{40 * DAY:012d}"]
+    assert not any(segment._maps or segment._files for segment in second.segments.values())
+    assert second._current is None
+
+    first.close()
+    second.close()
+
+
+def test_query_reads_changed_ids_only(tmp_path: Path, mocker: MockerFixture):
+    first = HistoryStore(tmp_path, member_id="first", segment_seconds=DAY)
+    second = HistoryStore(tmp_path, member_id="second", segment_seconds=DAY)
+    first.append("foo", 0.5, 200, timestamp=100)
+    read_ids = mocker.spy(HistoryStore, "_read_ids")
+
+    assert [s.name for s in second.query(0, DAY)] == ["foo"]
+    assert [s.name for s in second.query(0, DAY, name="foo")] == ["foo"]
+    assert read_ids.call_count == 1
+
+    first.append("bar", 0.5, 200, timestamp=200)
+    assert [s.name for s in second.query(0, DAY)] == ["foo", "bar"]
+    assert read_ids.call_count == 2
+
+    first.close()
+    second.close()
+
+
+def test_query_limit_in_segment(store: HistoryStore, mocker: MockerFixture):
+    for i in range(100):
+        store.append(f"service{i % 2}", i / 100, 200, timestamp=i)
+    sample = mocker.patch("services.history_service.ProbeSample", wraps=ProbeSample)
+
+    assert [s.timestamp for s in store.query(0, DAY, limit=3, newest=True)] == [97, 98, 99]
+    assert [s.timestamp for s in store.query(0, DAY, name="service0", limit=2, newest=True)] == [96, 98]
+    assert [s.timestamp for s in store.query(0, DAY, name="service1", limit=2)] == [1, 3]
+    # Only the returned samples are created
+    assert sample.call_count == 7
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import httpx
+import main
+import pytest
+import services
+from models.settings import Settings
+from services import lifecycle_service, uptimer_service
+
+
+@pytest.mark.asyncio
+async def test_startup_ready(tmp_path: Path, mocker):
+    mocker.patch("services.services_path", new=services.services_path)
+    mocker.patch("services.uptimer_service.services_path", new=uptimer_service.services_path)
+    settings = Settings(
+        services_path=str(tmp_path / "data" / "services.json"),
+        history_path=str(tmp_path / "history"),
+        probe_enabled=False,
+    )
+
+    async with httpx.AsyncClient(app=main.api, base_url="http://test") as client:
+        resp = await client.get("/ready")
+        assert resp.status_code == 503
+        assert resp.json()["ready"] is False
+
+        await lifecycle_service.startup(settings)
+        try:
+            resp = await client.get("/ready")
+            assert resp.status_code == 200
+            readiness = resp.json()
+            assert readiness["ready"] is True
+            assert readiness["import_seconds"] > 0
+            assert set(readiness["steps"]) == {"registry", "http_pool", "history", "alerts", "probes"}
+
+            assert (tmp_path / "data" / "services.json").exists()
+            assert services.services_path == uptimer_service.services_path == tmp_path / "data" / "services.json"
+            assert uptimer_service.http_client is not None
+        finally:
+            await lifecycle_service.shutdown()
+
+        resp = await client.get("/ready")
+        assert resp.status_code == 503
+    assert uptimer_service.http_client is None
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import httpx
+import pytest
+from tools.load_test import LoopLagMonitor, StubFleet, StubProfile, percentile, summarize
+
+
+def test_profile_parse():
+    profile = StubProfile.parse("slow:latency=0.2,jitter=0.1,error_rate=0.5")
+    assert profile.name == "slow"
+    assert (profile.latency, profile.jitter, profile.error_rate, profile.timeout_rate) == (0.2, 0.1, 0.5, 0.0)
+    assert StubProfile.parse("fast").latency == 0.01
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1) == 100
+    assert percentile([], 0.5) is None
+    assert summarize([]) == {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+
+
+@pytest.mark.asyncio
+async def test_stub_fleet():
+    fleet = StubFleet([StubProfile("ok", latency=0), StubProfile("error", latency=0, error_rate=1)])
+    await fleet.start()
+    try:
+        services = fleet.services(4)
+        assert [service["name"] for service in services] == ["load0", "load1", "load2", "load3"]
+        assert fleet.services(1, prefix="load-run-")[0]["name"] == "load-run-0"
+
+        async with httpx.AsyncClient() as client:
+            statuses = [(await client.get(service["url"])).status_code for service in services]
+        assert statuses == [200, 500, 200, 500]
+        assert fleet.requests == {"ok": 2, "error": 2}
+    finally:
+        await fleet.stop()
+
+
+def test_loop_lag_file(tmp_path: Path):
+    path = tmp_path / "lag.txt"
+    path.write_text("10.0 0.5\n20.0 0.25\n30.0")
+    assert LoopLagMonitor.read(str(path)) == [0.5, 0.25]
+    assert LoopLagMonitor.read(str(path), since=15) == [0.25]
+    assert LoopLagMonitor.read(str(tmp_path / "missing.txt")) == []
@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+from typing import List
+
+import pytest
+from models.service import ConfigService, PingService
+from models.service_error import PingError
+from pytest_mock import MockerFixture
+from services.probe_service import HashRing, Membership, ProbeScheduler
+
+
+@pytest.fixture
+def services() -> List[ConfigService]:
+    return [ConfigService(name=f"service{i}", url=f"https://service{i}.url", ping=True) for i in range(1000)]
+
+
+def test_hash_ring(services: List[ConfigService]):
+    assert HashRing([]).owner("foo") is None
+
+    ring = HashRing(["a", "b", "c"])
+    owners = {service.name: ring.owner(service.name) for service in services}
+    counts = {member: list(owners.values()).count(member) for member in ring.members}
+    assert all(200 < count < 500 for count in counts.values())
+
+    # Only the services of the leaving member move
+    smaller = HashRing(["a", "b"])
+    for name, owner in owners.items():
+        if owner != "c":
+            assert smaller.owner(name) == owner
+
+
+def test_membership(tmp_path: Path):
+    store = tmp_path / "shards.sqlite3"
+    first = Membership(store, "first", ttl=30)
+    second = Membership(store, "second", ttl=30)
+
+    assert first.heartbeat(now=0) == ["first"]
+    assert second.heartbeat(now=10) == ["first", "second"]
+
+    # First member expired
+    assert second.heartbeat(now=40) == ["second"]
+
+    first.heartbeat(now=41)
+    first.leave()
+    assert second.heartbeat(now=42) == ["second"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_without_duplicates(tmp_path: Path, mocker: MockerFixture, services: List[ConfigService]):
+    services[0].ping = False
+    pinged: List[str] = []
+
+    async def ping_service(service: PingService, configured: bool = False, alert: bool = False) -> PingService:
+        assert configured and alert
+        pinged.append(service.name)
+        if service.name == "service1":
+            raise PingError("not reachable", 408, service)
+        return service
+
+    mocker.patch("services.uptimer_service.get_services", return_value=services)
+    mocker.patch("services.uptimer_service.ping_service", new=ping_service)
+
+    store = tmp_path / "shards.sqlite3"
+    schedulers = [ProbeScheduler(Membership(store, f"worker{i}")) for i in range(3)]
+    for scheduler in schedulers:
+        await scheduler.refresh()
+    for scheduler in schedulers:
+        await scheduler.refresh()
+
+    rounds = [await scheduler.probe_round() for scheduler in schedulers]
+    assert all(count > 0 for count in rounds)
+    assert sorted(pinged) == sorted(service.name for service in services[1:])
+
+
+@pytest.mark.asyncio
+async def test_scheduler_waits_for_members(tmp_path: Path, mocker: MockerFixture, services: List[ConfigService]):
+    pinged: List[str] = []
+
+    async def ping_service(service: PingService, configured: bool = False, alert: bool = False) -> PingService:
+        assert configured and alert
+        pinged.append(service.name)
+        return service
+
+    mocker.patch("services.uptimer_service.get_services", return_value=services[:100])
+    mocker.patch("services.uptimer_service.ping_service", new=ping_service)
+
+    store = tmp_path / "shards.sqlite3"
+    first = ProbeScheduler(Membership(store, "worker0"), interval=60, heartbeat_interval=0.1)
+    second = ProbeScheduler(Membership(store, "worker1"), interval=60, heartbeat_interval=0.1)
+
+    # Both workers boot together, the first one only sees itself on start
+    await first.start()
+    assert first.ring.members == ["worker0"]
+    await second.start()
+    assert pinged == []
+
+    await asyncio.sleep(0.3)
+    await first.stop()
+    await second.stop()
+    assert sorted(pinged) == sorted(service.name for service in services[:100])
+
+
+@pytest.mark.asyncio
+async def test_probe_skips_moved_service(tmp_path: Path, mocker: MockerFixture, services: List[ConfigService]):
+    ping = mocker.patch("services.uptimer_service.ping_service")
+    scheduler = ProbeScheduler(Membership(tmp_path / "shards.sqlite3", "worker0"))
+    scheduler.ring = HashRing(["worker0", "worker1"])
+    moved = next(service for service in services if scheduler.ring.owner(service.name) == "worker1")
+
+    assert await scheduler.probe(moved) is False
+    ping.assert_not_called()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import fastapi
+import httpx
+import pytest
+from services import profiler_service
+from services.profiler_service import Profiler, ProfilerMiddleware
+
+
+async def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def waiting(seconds: float):
+    await asyncio.sleep(seconds)
+
+
+async def handler():
+    await waiting(0.05)
+    await busy(0.05)
+
+
+@pytest.mark.asyncio
+async def test_profiler_samples_running_and_waiting():
+    profiler = Profiler(interval=0.001)
+
+    async def request():
+        handle = profiler.begin()
+        await handler()
+        profiler.end(handle, "GET /foo")
+
+    await asyncio.create_task(request())
+
+    [profile] = profiler.report()
+    assert profile.route == "GET /foo"
+    assert profile.requests == 1
+    assert profile.wall_time >= 0.1
+
+    functions = {frame.split(":")[-2] for sample in profile.stacks for frame in sample.stack}
+    assert {"handler", "waiting", "busy"} <= functions
+
+    profiler.clear()
+    assert profiler.report() == []
+
+
+@pytest.mark.asyncio
+async def test_sample_after_end(mocker):
+    # Long interval, so only the manual sample runs
+    profiler = Profiler(interval=60)
+    handle = profiler.begin()
+
+    # The request ends while the sampler walks the stacks
+    def task_stack(request, thread_frame):
+        profiler.end(request, "GET /foo")
+        return ("frame",)
+
+    mocker.patch.object(profiler, "_task_stack", side_effect=task_stack)
+    profiler._sample()
+
+    assert handle.stacks == {}
+    assert profiler.report()[0].stacks == []
+
+
+def test_profiler_sample_rate():
+    assert Profiler(enabled=False, sample_rate=1).should_profile() is False
+    assert Profiler(enabled=True, sample_rate=1).should_profile() is True
+    assert Profiler(enabled=True, sample_rate=0).should_profile() is False
+
+
+@pytest.mark.asyncio
+async def test_middleware(mocker):
+    mocker.patch("services.profiler_service.profiler", new=Profiler(interval=0.001, header_enabled=True))
+
+    app = fastapi.FastAPI()
+    app.add_middleware(ProfilerMiddleware)
+
+    @app.get("/api/foo/{name}")
+    async def foo(name: str):
+        await busy(0.02)
+        return {"name": name}
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/api/foo/bar")
+        assert profiler_service.profiler.report() == []
+
+        resp = await client.get("/api/foo/bar", headers={"X-Profile": "1"})
+        assert resp.json() == {"name": "bar"}
+
+    [profile] = profiler_service.profiler.report()
+    assert profile.route == "GET /api/foo/{name}"
+    assert profile.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_header_disabled(mocker):
+    mocker.patch("services.profiler_service.profiler", new=Profiler(interval=0.001))
+    begin = mocker.spy(profiler_service.profiler, "begin")
+
+    app = fastapi.FastAPI()
+    app.add_middleware(ProfilerMiddleware)
+
+    @app.get("/api/foo")
+    async def foo():
+        return {}
+
+    # The header is ignored by default
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/api/foo", headers={"X-Profile": "1"})
+    begin.assert_not_called()
+    assert profiler_service.profiler.report() == []
+    assert Profiler(header="", header_enabled=True).header_enabled is False
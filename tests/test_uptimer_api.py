@@ -0,0 +1,67 @@
+from typing import Dict, List
+
+import httpx
+import main
+import pytest
+import services
+from httpx import ConnectError
+from py import path
+from pytest_mock import MockerFixture
+
+
+@pytest.fixture()
+def conf_path(mocker: MockerFixture, tmpdir: path.local) -> path.local:
+    tmp_path = tmpdir.join("test_config.json")
+    mocker.patch("services.uptimer_service.services_path", new=tmp_path)
+    config: List[Dict] = [{"name": "foo", "url": "https://foo.url", "ping": False}]
+    services.set_json_data(config, tmp_path)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_patch_if_match(conf_path: path.local):
+    async with httpx.AsyncClient(app=main.api, base_url="http://test") as client:
+        resp = await client.get("/api/service/foo/config")
+        assert resp.headers["ETag"] == '"1"'
+
+        resp = await client.patch("/api/service/foo/update", json={"ping": True}, headers={"If-Match": '"1"'})
+        assert resp.status_code == 200
+        version = resp.json()["version"]
+        assert resp.json() == {"name": "foo", "url": "https://foo.url", "ping": True, "version": version}
+        assert resp.headers["ETag"] == f'"{version}"'
+
+        # A second editor with the old version is rejected
+        resp = await client.patch("/api/service/foo/update", json={"name": "bar"}, headers={"If-Match": '"1"'})
+        assert resp.status_code == 412
+        assert resp.json()["service"]["version"] == version
+
+        # PUT returns the new version like PATCH
+        body = {"name": "foo", "url": "https://foo.url", "ping": True}
+        resp = await client.put("/api/service/foo/update", json=body, headers={"If-Match": f'"{version}"'})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] == f'"{resp.json()["version"]}"'
+        assert resp.json()["version"] != version
+
+        resp = await client.patch("/api/service/foo/update", json={"name": "bar"}, headers={"If-Match": "nope"})
+        assert resp.status_code == 400
+
+        resp = await client.patch("/api/service/foo/update", json={"name": "bar"})
+        assert resp.status_code == 200
+        assert (await client.get("/api/services/config")).json() == [
+            {"name": "bar", "url": "https://foo.url", "ping": True}
+        ]
+
+
+@pytest.mark.asyncio
+async def test_ping_by_name_without_alert(conf_path: path.local, mocker: MockerFixture):
+    observe = mocker.patch("services.alert_service.observe")
+    record = mocker.patch("services.history_service.record")
+    client = mocker.patch("services.uptimer_service.http_client")
+    client.get = mocker.AsyncMock(side_effect=ConnectError("not reachable"))
+
+    # Every worker can answer the ping, only the owner of the service in the ProbeScheduler alerts
+    async with httpx.AsyncClient(app=main.api, base_url="http://test") as api_client:
+        resp = await api_client.get("/api/service/foo/ping")
+    assert resp.status_code == 408
+    observe.assert_not_called()
+    record.assert_called_once_with("foo", None, 0)
@@ -1,11 +1,13 @@
+import errno
+import os
 from datetime import timedelta
 from typing import Dict, List
 
 import pytest
 import services
 from httpx import Response
-from models.service import ConfigService, PingService, Service
-from models.service_error import PingError, ServiceDuplicate, ServiceNotFound
+from models.service import ConfigService, PingService, Service, ServicePatch
+from models.service_error import PingError, ServiceDuplicate, ServiceNotFound, ServiceVersionConflict
 from models.validation_error import InvalidURL
 from py import path
 from pytest_httpx import HTTPXMock
@@ -121,6 +123,33 @@ async def test_ping_services(
     assert conf_services == fake_config_obj
 
 
+@pytest.mark.asyncio
+async def test_ping_feeds_history_and_alerts(
+    httpx_mock: HTTPXMock, mocker: MockerFixture, fake_config_obj: List[ConfigService], conf_path: path.local
+):
+    observe = mocker.patch("services.alert_service.observe")
+    record = mocker.patch("services.history_service.record")
+    httpx_mock.add_response(status_code=500)
+
+    # Ad-hoc ping with a url
+    with pytest.raises(PingError):
+        await uptimer_service.ping_service(PingService(name="adhoc", url="https://adhoc.url"))
+    observe.assert_not_called()
+    record.assert_not_called()
+
+    # Ping of a configured service by name, only the ProbeScheduler alerts
+    with pytest.raises(PingError):
+        await uptimer_service.ping_service(PingService(name=fake_config_obj[0].name))
+    observe.assert_not_called()
+    record.assert_called_once_with(fake_config_obj[0].name, None, 500)
+
+    with pytest.raises(PingError):
+        service = PingService(name=fake_config_obj[0].name, url=fake_config_obj[0].url)
+        await uptimer_service.ping_service(service, configured=True, alert=True)
+    observe.assert_called_once()
+    assert observe.call_args[0] == (fake_config_obj[0].name,)
+
+
 def test_delete(fake_config_obj: List[ConfigService], conf_path: path.local):
 
     # Delete service 0
@@ -192,7 +221,9 @@ def test_update_service(
     u_service.url = "https://updated.url"
     u_service.ping = True
 
-    assert u_service == uptimer_service.update_service(fake_config_obj[0], u_service)
+    updated = uptimer_service.update_service(fake_config_obj[0], u_service)
+    assert u_service.dict() == updated.dict(exclude={"version"})
+    assert updated.version != 1
 
     # Check if data is changed
     conf_services = [ConfigService(**service) for service in get_json_data(conf_path)]
@@ -204,7 +235,8 @@ def test_update_service(
     u_service.url = "https://updated1.url"
     u_service.ping = True
 
-    assert u_service == uptimer_service.update_service(fake_config_obj[1], u_service)
+    updated = uptimer_service.update_service(fake_config_obj[1], u_service)
+    assert u_service.dict() == updated.dict(exclude={"version"})
 
     # Check if data is changed
     conf_services = [ConfigService(**service) for service in get_json_data(conf_path)]
@@ -227,6 +259,124 @@ def test_update_service(
         uptimer_service.update_service(fake_config_obj[2], u_service)
 
 
+def test_patch_service(fake_config_obj: List[ConfigService], conf_path: path.local):
+    # Only the given field is changed and the version changed
+    patched = uptimer_service.patch_service(fake_config_obj[0].name, ServicePatch(url="https://patched.url"))
+    assert patched.url == "https://patched.url"
+    assert patched.ping == fake_config_obj[0].ping
+    assert patched.version != 1
+    assert uptimer_service.get_versioned_service(fake_config_obj[0].name) == patched
+
+    # Version must match
+    with pytest.raises(ServiceVersionConflict):
+        uptimer_service.patch_service(fake_config_obj[0].name, ServicePatch(ping=True), version=1)
+    version = patched.version
+    patched = uptimer_service.patch_service(fake_config_obj[0].name, ServicePatch(ping=True), version=version)
+    assert patched.ping is True and patched.version not in (1, version)
+
+    # Rename in one write at the same position
+    renamed = uptimer_service.patch_service(fake_config_obj[1].name, ServicePatch(name="renamed"))
+    conf_services = uptimer_service.get_services()
+    assert conf_services[1].name == "renamed"
+    assert len(conf_services) == len(fake_config_obj)
+    assert renamed.version != 1
+
+    with pytest.raises(ServiceDuplicate):
+        uptimer_service.patch_service(fake_config_obj[2].name, ServicePatch(name=fake_config_obj[3].name.upper()))
+
+    with pytest.raises(ServiceNotFound):
+        uptimer_service.patch_service("unknown", ServicePatch(ping=True))
+
+    with pytest.raises(InvalidURL):
+        uptimer_service.patch_service(fake_config_obj[2].name, ServicePatch(url="invalid"))
+
+    # Failed changes do not change the config
+    assert uptimer_service.get_services()[2:] == fake_config_obj[2:]
+
+
+def test_update_service_version(fake_config_obj: List[ConfigService], conf_path: path.local):
+    u_service = fake_config_obj[0].copy()
+    u_service.ping = True
+
+    with pytest.raises(ServiceVersionConflict):
+        uptimer_service.update_service(fake_config_obj[0], u_service, version=2)
+    updated = uptimer_service.update_service(fake_config_obj[0], u_service, version=1)
+    assert uptimer_service.get_versioned_service(u_service.name) == updated
+
+
+def test_version_after_readd(fake_config_obj: List[ConfigService], conf_path: path.local):
+    service = fake_config_obj[0]
+    old = uptimer_service.patch_service(service.name, ServicePatch(ping=True))
+
+    # A editor with the version of the deleted service can not change the new service with the same name
+    uptimer_service.delete_service(service)
+    uptimer_service.add_service(service)
+    new = uptimer_service.get_versioned_service(service.name)
+    assert new.version not in (1, old.version)
+    with pytest.raises(ServiceVersionConflict):
+        uptimer_service.patch_service(service.name, ServicePatch(ping=False), version=old.version)
+
+
+def test_set_json_data(tmpdir: path.local):
+    file = tmpdir.join("data.json")
+    file.write("[]")
+    file.chmod(0o640)
+
+    services.set_json_data([1, 2], file)
+    assert get_json_data(file) == [1, 2]
+    assert file.stat().mode & 0o777 == 0o640
+
+    # A failed write keeps the old file and leaves no temp file
+    with pytest.raises(TypeError):
+        services.set_json_data([object()], file)
+    assert get_json_data(file) == [1, 2]
+    assert tmpdir.listdir() == [file]
+
+
+def test_set_json_data_link(tmpdir: path.local, mocker: MockerFixture):
+    target = tmpdir.join("target.json")
+    target.write("[]")
+    link = tmpdir.join("link.json")
+    link.mksymlinkto(target)
+
+    # The link stays, the file it points to is replaced
+    services.set_json_data([1], link)
+    assert link.islink() and get_json_data(target) == [1]
+
+    # A bind mounted file can not be replaced, it is written in place
+    mocker.patch("os.replace", side_effect=OSError(errno.EBUSY, "Device or resource busy"))
+    services.set_json_data([2], link)
+    assert get_json_data(target) == [2]
+    assert sorted(p.basename for p in tmpdir.listdir()) == ["link.json", "target.json"]
+
+
+def test_set_json_data_new_file(tmpdir: path.local):
+    umask = os.umask(0o027)
+    try:
+        services.set_json_data([], tmpdir.join("new.json"))
+    finally:
+        os.umask(umask)
+    assert tmpdir.join("new.json").stat().mode & 0o777 == 0o640
+
+
+def test_config_cache(fake_config_obj: List[ConfigService], conf_path: path.local):
+    # Returned services can be changed without changing the cache
+    conf_services = uptimer_service.get_services()
+    conf_services.pop()
+    conf_services[0].name = "changed"
+    assert fake_config_obj == uptimer_service.get_services()
+
+    # Changes of the file are read again
+    services.set_json_data(services.get_json_data(conf_path)[:5], conf_path)
+    assert fake_config_obj[:5] == uptimer_service.get_services()
+
+    # Changes under the lock read the file, also if a other worker wrote it in place with same mtime and size
+    stat = conf_path.stat()
+    conf_path.write(conf_path.read().replace('"test0"', '"best0"'))
+    os.utime(conf_path, ns=(stat.atime_ns, stat.mtime_ns))
+    assert uptimer_service.delete_service(Service(name="best0")).name == "best0"
+
+
 # fmt:off
 @pytest.mark.parametrize(
     "url, exception",
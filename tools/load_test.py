@@ -0,0 +1,567 @@
+"""Load test for the Dashboard with a local fleet of simulated services.
+
+Starts stub HTTP services with configurable latency, error and timeout profiles, registers them with
+/api/services/add and drives a mix of config, ping and bulk ping requests against the app. The report contains
+the throughput, the latency percentiles per request kind and the event loop lag of the app.
+
+The app runs in a own process, so the load generator does not compete with it for the GIL.
+
+Run with: python -m tools.load_test --services 500 --concurrency 50 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+
+class StubProfile:
+    """Behaviour of a group of stub services
+
+    Args:
+        name (str): Name of the profile
+        latency (float): Mean response time in seconds
+        jitter (float): Maximal random deviation of the response time in seconds
+        error_rate (float): Fraction of the requests that are answered with status code 500
+        timeout_rate (float): Fraction of the requests that are not answered before hang seconds
+        hang (float): Time in seconds a timed out request is kept open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency: float = 0.01,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang: float = 10.0,
+    ) -> None:
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+
+    @classmethod
+    def parse(cls, spec: str) -> "StubProfile":
+        """Parse a profile like name:latency=0.05,jitter=0.01,error_rate=0.1,timeout_rate=0.01
+
+        Args:
+            spec (str): Profile definition of the command line
+
+        Returns:
+            StubProfile: Parsed profile
+        """
+        name, _, options = spec.partition(":")
+        values = {}
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            values[key.strip()] = float(value)
+        return cls(name, **values)
+
+
+class StubFleet:
+    """One local HTTP server per profile. Every path of a server is one simulated service
+
+    Args:
+        profiles (Sequence[StubProfile]): Profiles of the servers
+        host (str): Address to listen on
+    """
+
+    def __init__(self, profiles: Sequence[StubProfile], host: str = "127.0.0.1") -> None:
+        self.profiles = list(profiles)
+        self.host = host
+        self.ports: Dict[str, int] = {}
+        self.requests: Counter = Counter()
+        self._servers: List[asyncio.AbstractServer] = []
+
+    async def start(self) -> None:
+        """Start the servers on free ports"""
+        for profile in self.profiles:
+            server = await asyncio.start_server(
+                lambda reader, writer, profile=profile: self._handle(profile, reader, writer), self.host, 0
+            )
+            self._servers.append(server)
+            self.ports[profile.name] = server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop the servers"""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+    def services(self, count: int, prefix: str = "load") -> List[dict]:
+        """Create the service configs, distributed round robin over the profiles
+
+        Args:
+            count (int): Number of services
+            prefix (str): Prefix of the service names
+
+        Returns:
+            List[dict]: Configs for /api/services/add
+        """
+        services = []
+        for i in range(count):
+            profile = self.profiles[i % len(self.profiles)]
+            url = f"http://{self.host}:{self.ports[profile.name]}/s{i}"
+            services.append({"name": f"{prefix}{i}", "url": url, "ping": False})
+        return services
+
+    async def _handle(self, profile: StubProfile, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                self.requests[profile.name] += 1
+                if random.random() < profile.timeout_rate:
+                    await asyncio.sleep(profile.hang)
+                    break
+                await asyncio.sleep(max(profile.latency + random.uniform(-profile.jitter, profile.jitter), 0))
+                status = b"500 Internal Server Error" if random.random() < profile.error_rate else b"200 OK"
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: 2\r\nContent-Type: text/plain\r\n\r\nok")
+                await writer.drain()
+                if b"connection: close" in request.lower():
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Hanging connections are cancelled on shutdown, the stream callback would report them as errors
+            pass
+        finally:
+            writer.close()
+
+
+def percentile(values: Sequence[float], fraction: float) -> Optional[float]:
+    """Get the percentile with the nearest rank method
+
+    Args:
+        values (Sequence[float]): Measured values
+        fraction (float): Percentile between 0 and 1
+
+    Returns:
+        Optional[float]: The percentile, None if there are no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(max(math.ceil(fraction * len(ordered)) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(values: Sequence[float]) -> dict:
+    """Get the count and percentiles of the values
+
+    Args:
+        values (Sequence[float]): Measured values in seconds
+
+    Returns:
+        dict: count, p50, p90, p99 and max
+    """
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires in the event loop
+
+    Args:
+        interval (float): Time in seconds between two measurements
+        path (str, optional): File to append every measurement as "unix_time lag" line
+    """
+
+    def __init__(self, interval: float = 0.05, path: str = None) -> None:
+        self.interval = interval
+        self.path = path
+        self.lags: List[float] = []
+
+    async def run(self) -> None:
+        """Measure until cancelled"""
+        loop = asyncio.get_running_loop()
+        file = open(self.path, mode="a", buffering=1, encoding="utf8") if self.path else None
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(loop.time() - expected, 0.0)
+                self.lags.append(lag)
+                if file is not None:
+                    file.write(f"{time.time()} {lag}\n")
+        finally:
+            if file is not None:
+                file.close()
+
+    @staticmethod
+    def read(path: str, since: float = 0.0) -> List[float]:
+        """Read the lags a monitor wrote to the file
+
+        Args:
+            path (str): File of the monitor
+            since (float): Only lags measured after this Unix time
+
+        Returns:
+            List[float]: Lags in seconds
+        """
+        lags = []
+        try:
+            with open(path, mode="r", encoding="utf8") as file:
+                for line in file:
+                    parts = line.split()
+                    if len(parts) == 2 and float(parts[0]) >= since:
+                        lags.append(float(parts[1]))
+        except FileNotFoundError:
+            pass
+        return lags
+
+
+async def serve(port: int, lag_path: str) -> None:
+    """Run the Dashboard with uvicorn and a LoopLagMonitor in the current process until it is stopped
+
+    Args:
+        port (int): Port on 127.0.0.1
+        lag_path (str): File for the measured event loop lags
+    """
+    import uvicorn  # pylint: disable=import-outside-toplevel
+
+    server = uvicorn.Server(uvicorn.Config("main:api", port=port, log_level="warning", lifespan="on"))
+    monitor = asyncio.create_task(LoopLagMonitor(path=lag_path).run())
+    try:
+        await server.serve()
+    finally:
+        monitor.cancel()
+
+
+class AppServer:
+    """Run the Dashboard in a own process, so the load generator does not share the GIL with the app
+
+    Args:
+        data_dir (str): Directory for the service config, the history and the measured event loop lags
+        probe (bool): Enable the automatic probing of the app
+        timeout (float): Maximal time in seconds to wait for the app
+    """
+
+    def __init__(self, data_dir: str, probe: bool = False, timeout: float = 30.0) -> None:
+        self.data_dir = data_dir
+        self.probe = probe
+        self.timeout = timeout
+        self.lag_path = os.path.join(data_dir, "loop_lag.txt")
+        self.url = ""
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        """Start the app and wait until it is ready"""
+        env = dict(
+            os.environ,
+            DASHBOARD_SERVICES_PATH=os.path.join(self.data_dir, "services.json"),
+            DASHBOARD_HISTORY_PATH=os.path.join(self.data_dir, "history"),
+            DASHBOARD_SHARD_STORE=os.path.join(self.data_dir, "shards.sqlite3"),
+            DASHBOARD_PROBE_ENABLED="true" if self.probe else "false",
+        )
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "tools.load_test", "--serve", str(port), "--lag-file", self.lag_path],
+            cwd=Path(__file__).absolute().parent.parent,
+            env=env,
+        )
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._process.poll() is not None:
+                raise RuntimeError("App could not be started")
+            try:
+                if httpx.get(f"{self.url}/ready").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError("App was not ready in time")
+            time.sleep(0.05)
+
+    def lags(self, since: float = 0.0) -> List[float]:
+        """Get the event loop lags of the app
+
+        Args:
+            since (float): Only lags measured after this Unix time
+
+        Returns:
+            List[float]: Lags in seconds
+        """
+        return LoopLagMonitor.read(self.lag_path, since)
+
+    def stop(self) -> None:
+        """Stop the app"""
+        if self._process is not None:
+            self._process.send_signal(signal.SIGINT)
+            try:
+                self._process.wait(self.timeout)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+
+class LoadTest:
+    """Drive a mix of requests against the app
+
+    Args:
+        url (str): Base URL of the app
+        names (List[str]): Names of the registered services
+        concurrency (int): Number of parallel clients
+        mix (Dict[str, float]): Weight of the request kinds config, ping and bulk
+        bulk_size (int): Number of services in one bulk ping
+    """
+
+    def __init__(
+        self, url: str, names: List[str], concurrency: int, mix: Dict[str, float], bulk_size: int = 20
+    ) -> None:
+        self.url = url
+        self.names = names
+        self.concurrency = concurrency
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.bulk_size = bulk_size
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in self.kinds}
+        self.statuses: Dict[str, Counter] = {kind: Counter() for kind in self.kinds}
+
+    async def request(self, client: httpx.AsyncClient, kind: str) -> int:
+        """Send one request of the kind
+
+        Args:
+            client (httpx.AsyncClient): Client of the worker
+            kind (str): config, ping or bulk
+
+        Returns:
+            int: HTTP status code
+        """
+        if kind == "config":
+            resp = await client.get("/api/services/config")
+        elif kind == "ping":
+            resp = await client.get(f"/api/service/{random.choice(self.names)}/ping")
+        else:
+            names = random.sample(self.names, min(self.bulk_size, len(self.names)))
+            resp = await client.request("GET", "/api/services/ping", json=[{"name": name} for name in names])
+        return resp.status_code
+
+    async def worker(self, client: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            kind = random.choices(self.kinds, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status = await self.request(client, kind)
+            except httpx.HTTPError as error:
+                status = type(error).__name__
+            self.latencies[kind].append(time.perf_counter() - started)
+            self.statuses[kind][status] += 1
+
+    async def run(self, duration: float) -> float:
+        """Run the workers for the duration
+
+        Args:
+            duration (float): Time in seconds
+
+        Returns:
+            float: Elapsed time in seconds
+        """
+        started = time.perf_counter()
+        limits = httpx.Limits(max_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.url, limits=limits, timeout=60) as client:
+            await asyncio.gather(*(self.worker(client, started + duration) for _ in range(self.concurrency)))
+        return time.perf_counter() - started
+
+
+async def register(url: str, services: List[dict], chunk: int = 500) -> None:
+    """Add the services to the app
+
+    Args:
+        url (str): Base URL of the app
+        services (List[dict]): Configs of the services
+        chunk (int): Number of services per request
+    """
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        for start in range(0, len(services), chunk):
+            resp = await client.post("/api/services/add", json=services[start : start + chunk])
+            resp.raise_for_status()
+
+
+async def unregister(url: str, names: List[str], chunk: int = 500) -> None:
+    """Delete the services from the app. Services that are already missing are ignored
+
+    Args:
+        url (str): Base URL of the app
+        names (List[str]): Names of the services
+        chunk (int): Number of services per request
+    """
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        for start in range(0, len(names), chunk):
+            body = [{"name": name} for name in names[start : start + chunk]]
+            resp = await client.request("DELETE", "/api/services/delete", json=body)
+            if resp.status_code != 404:
+                resp.raise_for_status()
+
+
+async def run(args: argparse.Namespace, app: Optional[AppServer] = None) -> dict:
+    """Start the fleet, register the services, run the load and build the report
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+        app (AppServer, optional): Running app for the event loop lag. Not needed if args.url is set
+
+    Returns:
+        dict: Report of the load test
+    """
+    fleet = StubFleet([StubProfile.parse(spec) for spec in args.profile])
+    await fleet.start()
+    url = args.url or app.url
+    # A own prefix per run, so the services of a running app are never touched
+    services = fleet.services(args.services, prefix=f"load-{uuid.uuid4().hex[:8]}-")
+    names = [service["name"] for service in services]
+    try:
+        await register(url, services)
+        mix = {"config": args.config_weight, "ping": args.ping_weight, "bulk": args.bulk_weight}
+        load = LoadTest(url, names, args.concurrency, mix, args.bulk_size)
+        lag_start = time.time()
+        elapsed = await load.run(args.duration)
+        lags = app.lags(since=lag_start) if app else None
+    finally:
+        try:
+            # The started app is thrown away with its data directory
+            if args.url:
+                await unregister(url, names)
+        finally:
+            await fleet.stop()
+
+    total = sum(len(values) for values in load.latencies.values())
+    return {
+        "services": args.services,
+        "concurrency": args.concurrency,
+        "duration": elapsed,
+        "requests": total,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "kinds": {
+            kind: {
+                "throughput": len(load.latencies[kind]) / elapsed if elapsed else 0.0,
+                "latency": summarize(load.latencies[kind]),
+                "statuses": {str(status): count for status, count in load.statuses[kind].items()},
+            }
+            for kind in load.kinds
+        },
+        "stub_requests": dict(fleet.requests),
+        "loop_lag": summarize(lags) if app else None,
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def format_report(report: dict) -> str:
+    """Format the report as text
+
+    Args:
+        report (dict): Report of run
+
+    Returns:
+        str: Readable report
+    """
+    lines = [
+        f"{report['services']} services, {report['concurrency']} clients, {report['duration']:.1f}s",
+        f"{report['requests']} requests, {report['throughput']:.1f} req/s",
+        "",
+        f"{'kind':8} {'req/s':>8} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}  statuses",
+    ]
+    for kind, stats in report["kinds"].items():
+        latency = stats["latency"]
+        lines.append(
+            f"{kind:8} {stats['throughput']:8.1f} {_ms(latency['p50']):>10} {_ms(latency['p90']):>10} "
+            f"{_ms(latency['p99']):>10} {_ms(latency['max']):>10}  {stats['statuses']}"
+        )
+    lag = report["loop_lag"]
+    if lag is not None:
+        lines += ["", f"event loop lag: p50 {_ms(lag['p50'])}, p99 {_ms(lag['p99'])}, max {_ms(lag['max'])}"]
+    return "\n".join(lines)
+
+
+def parse_args(argv: Sequence[str] = None) -> argparse.Namespace:
+    """Parse the command line
+
+    Args:
+        argv (Sequence[str], optional): Arguments. Defaults to sys.argv
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Test a running app instead of starting one. The loop lag is not measured")
+    parser.add_argument("--services", type=int, default=100, help="Number of simulated services")
+    parser.add_argument(
+        "--profile",
+        action="append",
+        help="Stub profile name:latency=0.01,jitter=0,error_rate=0,timeout_rate=0,hang=10. Can be repeated",
+    )
+    parser.add_argument("--concurrency", type=int, default=10, help="Number of parallel clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duration of the load in seconds")
+    parser.add_argument("--config-weight", type=float, default=1.0, help="Weight of the config requests")
+    parser.add_argument("--ping-weight", type=float, default=5.0, help="Weight of the single ping requests")
+    parser.add_argument("--bulk-weight", type=float, default=1.0, help="Weight of the bulk ping requests")
+    parser.add_argument("--bulk-size", type=int, default=20, help="Number of services in one bulk ping")
+    parser.add_argument("--probe", action="store_true", help="Enable the automatic probing of the started app")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    # Used by AppServer to run the app in a own process
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--lag-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.profile = args.profile or ["fast:latency=0.005", "slow:latency=0.2,jitter=0.1", "flaky:error_rate=0.3"]
+    return args
+
+
+def main(argv: Sequence[str] = None) -> dict:
+    """Run the load test from the command line
+
+    Args:
+        argv (Sequence[str], optional): Arguments. Defaults to sys.argv
+
+    Returns:
+        dict: Report of the load test
+    """
+    args = parse_args(argv)
+    if args.serve:
+        asyncio.run(serve(args.serve, args.lag_file))
+        return {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = None
+        if not args.url:
+            app = AppServer(data_dir, probe=args.probe)
+            app.start()
+        try:
+            report = asyncio.run(run(args, app))
+        finally:
+            if app is not None:
+                app.stop()
+    print(json.dumps(report, indent="\t") if args.json else format_report(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()